@@ -12,104 +12,2063 @@ Run:
   1) python3 -m venv venv
   2) source venv/bin/activate  (Unix)  or  venv\\Scripts\\activate (Windows)
   3) pip install Flask numpy
-  4) python smart_voting_system.py
-  5) Open http://127.0.0.1:5000  and http://127.0.0.1:5000/admin
+  4) python smart_voting_system.py fetch-assets   (once; self-hosts the QR library and fonts)
+  5) python smart_voting_system.py
+  6) Open http://127.0.0.1:5000  and http://127.0.0.1:5000/admin
+
+Production (booth server): pre-forks one worker per CPU sharing the database,
+warms each up and shuts down gracefully on SIGTERM / Ctrl-C:
+  python smart_voting_system.py --db /srv/svm/svm.db serve --bind 0.0.0.0:5000 --workers 8
+Options may also come from SVM_DB_PATH, SVM_SHARDS, SVM_BIND and SVM_WORKERS.
+Each worker limits /api/* to SVM_API_RATE requests/s (burst SVM_API_BURST) per client
+address and runs at most SVM_WRITE_CONCURRENCY vote writes at once (429/503 + Retry-After).
+Other WSGI servers can load the factory: "smart_voting_system:create_app()".
+
+Mock elections and training days can run the databases from RAM, backed up to --db every
+SVM_BACKUP_INTERVAL seconds (default 30) and at shutdown:
+  python smart_voting_system.py --db /srv/svm/mock.db --storage memory serve
+
+Every vote is also appended to a hash-chained <db>.ledger file (SVM_LEDGER=0 disables);
+check it against the votes table with:
+  python smart_voting_system.py --db /srv/svm/svm.db verify-ledger --flush
 
 
 This is a demo. NOT secure for production.
 """
+import argparse
+import atexit
+import base64
+import binascii
+import bisect
+import hashlib
+import heapq
+import hmac
+import csv
+import difflib
+import gzip
+import io
+import itertools
+import json
+import math
 import os
+import queue
+import random
+import shutil
+import signal
+import socket
 import sqlite3
+import sys
+import tempfile
 import logging
-from datetime import datetime
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from functools import lru_cache, wraps
+from datetime import datetime, timezone
 from pathlib import Path
 
 
-from flask import (Flask, flash, redirect, render_template_string, request,
-                   send_file, session, url_for, jsonify)
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within one process only
+    fcntl = None
+from flask import (Flask, Response, abort, flash, g, redirect, render_template, request,
+                   send_file, send_from_directory, session, stream_with_context, url_for, jsonify)
+from jinja2 import DictLoader
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+# App and DB config
+APP = Flask(__name__)
+APP.secret_key = os.environ.get("SVM_SECRET_KEY", "svm_demo_secret_key_change_me")
+BASE = Path(__file__).resolve().parent
+DB_PATH = Path(os.environ.get("SVM_DB_PATH", BASE / "svm_admin.db"))
+
+
+# Admin credentials
+ADMIN_USER = "poomalai005"
+ADMIN_PASS = "Poomalai2005@"
+VOTED_STATUS_PASSWORD = "989464"
+
+
+# Set up basic logging
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+# Metrics
+# In-process counters and histograms rendered in the Prometheus text format
+# at /metrics. Recording is a dict update under one lock (a few microseconds),
+# cheap enough to leave on during an election. Each process keeps its own
+# figures; scrape every worker, or sum them in the query.
+METRICS_TOKEN = os.environ.get("SVM_METRICS_TOKEN", "")  # if set, /metrics requires "Authorization: Bearer <token>"
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+METRIC_INFO = {
+    # name: (type, help, histogram buckets)
+    "svm_http_requests_total": ("counter", "HTTP requests by route, method and status.", None),
+    "svm_http_request_duration_seconds": ("histogram", "Time to produce the response, by route.", HTTP_BUCKETS),
+    "svm_db_query_duration_seconds": ("histogram", "SQLite execute() time by calling function.", DB_BUCKETS),
+    "svm_db_busy_retries_total": ("counter", "Transactions retried after SQLITE_BUSY/locked.", None),
+    "svm_db_busy_failures_total": ("counter", "Transactions abandoned after the last busy retry.", None),
+    "svm_verifications_total": ("counter", "Verification attempts by stage and result.", None),
+    "svm_votes_total": ("counter", "Vote attempts by source and outcome.", None),
+    "svm_voter_cache_hits_total": ("counter", "Voter cache hits.", None),
+    "svm_voter_cache_misses_total": ("counter", "Voter cache misses.", None),
+    "svm_voter_cache_entries": ("gauge", "Voters currently cached.", None),
+    "svm_ledger_records_total": ("counter", "Votes appended to the hash-chained ledger.", None),
+    "svm_ledger_fsync_seconds": ("histogram", "Ledger fsync time per group commit.", DB_BUCKETS),
+    "svm_rejected_requests_total": ("counter", "API requests shed by admission control, by reason and route.", None),
+    "svm_backup_seconds": ("histogram", "Memory storage: time to back one shard up to disk.", HTTP_BUCKETS),
+    "svm_backup_failures_total": ("counter", "Memory storage: shard backups that failed.", None),
+    "svm_backup_age_seconds": ("gauge", "Memory storage: age of the oldest shard's durable copy.", None),
+    "svm_sse_subscribers": ("gauge", "Live dashboard connections open in this process.", None),
+    "svm_sse_resyncs_total": ("counter", "Dashboard subscribers resent a snapshot after falling behind.", None),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe labelled counters and fixed-bucket histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(METRIC_INFO[name][2], seconds)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(METRIC_INFO[name][2]) + 1), 0.0]
+            hist[0][slot] += 1
+            hist[1] += seconds
+
+    def render(self, sampled=None):
+        """Returns every metric, plus unlabelled values sampled at scrape time, in the Prometheus text format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: ([*v[0]], v[1]) for k, v in self._histograms.items()}
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name, value in (sampled or {}).items():
+            by_name.setdefault(name, []).append(((), value))
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text, buckets = METRIC_INFO[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name]):
+                if kind != "histogram":
+                    lines.append(f"{name}{_metric_labels(labels)} {value}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_metric_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_metric_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_metric_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_labels(labels):
+    """Formats label pairs as {k="v",...} with Prometheus escaping."""
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+METRICS = MetricsRegistry()
+
+
+def _call_site(frame):
+    """Names the function that issued a query, qualified where Python supports it (get_voter.<locals>.load)."""
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that records execute()/executemany() time per calling function."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            METRICS.observe("svm_db_query_duration_seconds", time.perf_counter() - started,
+                            site=_call_site(sys._getframe(1)))
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            METRICS.observe("svm_db_query_duration_seconds", time.perf_counter() - started,
+                            site=_call_site(sys._getframe(1)))
+
+
+# Connection management
+# Connections are opened once, configured once and then reused from a pool
+# instead of paying for sqlite3.connect() plus pragma setup on every request.
+DB_POOL_SIZE = int(os.environ.get("SVM_DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = 5000
+DB_BUSY_RETRIES = 5
+DB_BUSY_BACKOFF = 0.02
+DB_STATEMENT_CACHE = 256
+DB_PRAGMAS = (
+    ("journal_mode", "WAL"),        # readers no longer block the writer (and vice versa)
+    ("synchronous", "NORMAL"),      # fsync at checkpoints only; safe with WAL
+    ("cache_size", "-65536"),       # negative means KiB: 64 MiB page cache per connection
+    ("mmap_size", "268435456"),     # 256 MiB memory-mapped reads
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", str(DB_BUSY_TIMEOUT_MS)),
+)
+
+
+# Storage modes
+# SVM_STORAGE=memory runs the working databases from a RAM-backed filesystem
+# (SVM_MEMORY_DIR, default /dev/shm) with synchronous=OFF. They are loaded from
+# the durable files at startup and copied back with the online backup API every
+# SVM_BACKUP_INTERVAL seconds and at shutdown, so losing the machine loses at
+# most one interval of votes. RAM files rather than ":memory:" databases, so
+# the pre-forked workers still share one database with WAL concurrency.
+STORAGE_MODE = os.environ.get("SVM_STORAGE", "disk")
+STORAGE_MODES = ("disk", "memory")
+BACKUP_INTERVAL_S = float(os.environ.get("SVM_BACKUP_INTERVAL", "30"))
+MEMORY_DIR = Path(os.environ.get("SVM_MEMORY_DIR") or
+                  ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()))
+MEMORY_PRAGMAS = tuple((k, "OFF" if k == "synchronous" else v) for k, v in DB_PRAGMAS)
+
+
+def memory_path(durable):
+    """The RAM working copy of a durable database file; stable, so every process finds the same one."""
+    durable = Path(durable).resolve()
+    digest = hashlib.sha1(str(durable).encode("utf-8")).hexdigest()[:12]
+    return MEMORY_DIR / f"svm-{digest}-{durable.name}"
+
+
+class ConnectionPool:
+    """A bounded pool of persistent, pre-configured SQLite connections."""
+
+    def __init__(self, path, size=None, pragmas=DB_PRAGMAS):
+        self.path = str(path)
+        self.size = size = DB_POOL_SIZE if size is None else size
+        self.pragmas = pragmas
+        self._pid = os.getpid()
+        # LIFO hands out the most recently used connection, whose page cache is warmest.
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        """Opens a new connection and applies the tuning pragmas."""
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, factory=TimedConnection,
+                               check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def acquire(self):
+        """Takes an idle connection from the pool, opening one if none is free."""
+        if os.getpid() != self._pid:
+            # Connections must never cross a fork(); the child starts with an empty pool.
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size)
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back any unfinished transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        """Closes every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# Sharding
+# With SVM_SHARDS=N > 1 the data lives in N independent SQLite files, each with
+# its own writer lock, and a voter (with their votes, SMS and sync log) lives in
+# the shard chosen by a stable hash of voter_id. Lookups by voter_id go to one
+# shard; admin listings, exports and tallies fan out to all shards and merge.
+# The shard count is fixed for the life of a database set.
+NUM_SHARDS = max(1, int(os.environ.get("SVM_SHARDS", "1")))
+
+
+class ShardRouter:
+    """
+    Maps voter_ids to shard files and owns one connection pool per shard.
+    `paths` are the durable files; `working_paths` the ones connections open
+    (the same files, or their RAM copies in memory storage mode).
+    """
+
+    def __init__(self, base_path, count, storage="disk", pool_size=None):
+        self.base_path = base_path = Path(base_path)
+        self.count = count
+        self.storage = storage
+        self.pool_size = pool_size = DB_POOL_SIZE if pool_size is None else pool_size
+        if count == 1:
+            self.paths = [base_path]
+        else:
+            self.paths = [base_path.with_name(f"{base_path.stem}-shard{i}{base_path.suffix}") for i in range(count)]
+        if storage == "memory":
+            self.working_paths = [memory_path(p) for p in self.paths]
+            self.pools = [ConnectionPool(p, pool_size, MEMORY_PRAGMAS) for p in self.working_paths]
+        else:
+            self.working_paths = self.paths
+            self.pools = [ConnectionPool(p, pool_size) for p in self.paths]
+
+    def shard_for(self, voter_id):
+        """Returns the shard index that owns voter_id."""
+        if self.count == 1:
+            return 0
+        return zlib.crc32(str(voter_id).encode("utf-8")) % self.count
+
+    def close_all(self):
+        for pool in self.pools:
+            pool.close_all()
+
+
+_ROUTER = None
+
+
+def get_router():
+    """Returns the shard router for DB_PATH, NUM_SHARDS, STORAGE_MODE and DB_POOL_SIZE, creating it on first use."""
+    global _ROUTER
+    if _ROUTER is None or _ROUTER.count != NUM_SHARDS or _ROUTER.base_path != Path(DB_PATH) or \
+            _ROUTER.storage != STORAGE_MODE or _ROUTER.pool_size != DB_POOL_SIZE:
+        if _ROUTER is not None:
+            _ROUTER.close_all()
+        _ROUTER = ShardRouter(DB_PATH, NUM_SHARDS, STORAGE_MODE, DB_POOL_SIZE)
+    return _ROUTER
+
+
+def shard_for(voter_id):
+    """Returns the shard index that owns voter_id."""
+    return get_router().shard_for(voter_id)
+
+
+def all_shards():
+    """Returns the shard indexes, for fan-out queries."""
+    return range(get_router().count)
+
+
+def get_pool(shard=0):
+    """Returns the connection pool of one shard."""
+    return get_router().pools[shard]
+
+
+@contextmanager
+def db_conn(shard=0):
+    """Borrows a pooled connection outside of a request (CLI, startup, background work)."""
+    pool = get_pool(shard)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def get_conn(shard=0):
+    """Returns the pooled connection to `shard` bound to the current app context."""
+    conns = g.get("db_conns")
+    if conns is None:
+        conns = g.db_conns = {}
+    conn = conns.get(shard)
+    if conn is None:
+        conn = conns[shard] = get_pool(shard).acquire()
+    return conn
+
+
+def voter_conn(voter_id):
+    """Returns the request's connection to the shard that owns voter_id."""
+    return get_conn(shard_for(voter_id))
+
+
+@APP.before_request
+def start_background_workers():
+    """Starts the SMS, ledger and backup workers with the first request served by this process."""
+    SMS_DISPATCHER.start()
+    if LEDGER_ENABLED:
+        LEDGER_WRITER.start()
+    BACKUPS.start()
+
+
+@APP.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@APP.after_request
+def record_request_metrics(response):
+    """Counts the request and records its latency under the route pattern (not the raw path)."""
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        METRICS.inc("svm_http_requests_total", route=route, method=request.method, status=response.status_code)
+        METRICS.observe("svm_http_request_duration_seconds", time.perf_counter() - started,
+                        route=route, method=request.method)
+    return response
+
+
+@APP.teardown_appcontext
+def release_conn(exc):
+    """Hands the request's connections back to their pools."""
+    for shard, conn in g.pop("db_conns", {}).items():
+        get_pool(shard).release(conn)
+
+
+@atexit.register
+def close_pool():
+    """Closes pooled connections on interpreter exit."""
+    if _ROUTER is not None:
+        _ROUTER.close_all()
+
+
+def _is_busy(exc):
+    """True if an OperationalError is SQLite reporting a busy/locked database."""
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def run_in_transaction(conn, fn, *args):
+    """
+    Runs fn(conn, *args) inside a single BEGIN IMMEDIATE transaction and commits.
+    The write lock is taken up front, so the body never fails half-way on a lock
+    upgrade; if the lock cannot be had even after busy_timeout, the whole
+    transaction is retried a bounded number of times with jittered backoff.
+    fn must not have side effects outside the database.
+    """
+    for attempt in range(DB_BUSY_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e):
+                raise
+            if attempt == DB_BUSY_RETRIES:
+                METRICS.inc("svm_db_busy_failures_total", site=fn.__name__)
+                raise
+            METRICS.inc("svm_db_busy_retries_total", site=fn.__name__)
+            time.sleep(DB_BUSY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def init_db():
+    """Creates or migrates the tables of every shard to the current schema version."""
+    created = not all(Path(p).exists() for p in get_router().working_paths)
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            applied = migrate(conn)
+            if applied and not created:
+                logging.info(f"Shard {shard}: migrated to schema version {applied[-1]}")
+    return created
+
+
+# Memory storage: loading and backups
+_WORKING_LOCKS = {}   # working path -> lock file; a shared flock on it marks the copy as in use
+_BACKUP_OWNER = None  # pid of the process that loaded the working copies; only it backs them up
+
+
+def _working_signature(working):
+    """(mtime, size) of a working copy and its WAL; changes with every commit."""
+    return tuple((st.st_mtime_ns, st.st_size) for st in (os.stat(f) for f in (working, f"{working}-wal")
+                                                         if os.path.exists(f)))
+
+
+def _durable_ledger_path(shard):
+    return get_router().paths[shard].with_suffix(".ledger")
+
+
+def load_working_copies():
+    """
+    Memory storage: copies every durable shard (and its ledger) into RAM. A
+    working copy that another process is using is shared as it is, and one
+    left newer than its durable file by a crashed process is kept so that its
+    changes get backed up.
+    """
+    global _BACKUP_OWNER
+    router = get_router()
+    MEMORY_DIR.mkdir(parents=True, exist_ok=True)
+    for shard, (durable, working) in enumerate(zip(router.paths, router.working_paths)):
+        lock = _WORKING_LOCKS.get(working)
+        if lock is None:
+            lock = _WORKING_LOCKS[working] = open(f"{working}.lock", "a")
+        in_use = False
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                in_use = True
+        newer = working.exists() and (not durable.exists() or
+                                      max(t for t, _ in _working_signature(working)) > durable.stat().st_mtime_ns)
+        if in_use or newer:
+            logging.info(f"Shard {shard}: using the existing working copy {working}")
+        else:
+            for f in (working, f"{working}-wal", f"{working}-shm", ledger_path(shard)):
+                Path(f).unlink(missing_ok=True)
+            if durable.exists():
+                with closing(sqlite3.connect(durable)) as src, closing(sqlite3.connect(working)) as dst:
+                    src.backup(dst)
+                logging.info(f"Shard {shard}: loaded {durable} into {working}")
+            if _durable_ledger_path(shard).exists():
+                shutil.copyfile(_durable_ledger_path(shard), ledger_path(shard))
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+    _BACKUP_OWNER = os.getpid()
+
+
+def _sync_ledger(shard):
+    """Appends the working ledger's new complete lines to the durable ledger."""
+    working = ledger_path(shard)
+    if not working.exists():
+        return
+    with open(working, "rb") as src, open(_durable_ledger_path(shard), "ab") as dst:
+        if fcntl is not None:
+            fcntl.flock(src, fcntl.LOCK_SH)  # waits out a ledger append in progress
+        src.seek(dst.seek(0, os.SEEK_END))
+        data = src.read()
+        data = data[:data.rfind(b"\n") + 1]
+        if data:
+            dst.write(data)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+
+def backup_shard(shard):
+    """
+    Memory storage: copies a shard's working copy over its durable file with the
+    online backup API, through a temporary file so the durable copy is always
+    whole. The ledger is synced first so it never runs ahead of the database.
+    """
+    router = get_router()
+    durable, working = router.paths[shard], router.working_paths[shard]
+    tmp = durable.with_name(f"{durable.name}.{os.getpid()}.tmp")
+    started = time.perf_counter()
+    _sync_ledger(shard)
+    try:
+        with closing(sqlite3.connect(working, timeout=DB_BUSY_TIMEOUT_MS / 1000)) as src, \
+                closing(sqlite3.connect(tmp)) as dst:
+            src.backup(dst)
+        for f in (f"{durable}-wal", f"{durable}-shm"):
+            Path(f).unlink(missing_ok=True)  # left by a disk-mode run; must not be replayed onto the copy
+        os.replace(tmp, durable)
+        if os.name == "posix":
+            dir_fd = os.open(durable.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    finally:
+        tmp.unlink(missing_ok=True)
+    METRICS.observe("svm_backup_seconds", time.perf_counter() - started)
+
+
+class BackupScheduler:
+    """Backs the RAM working copies up to disk every BACKUP_INTERVAL_S and at exit, skipping unchanged shards."""
+
+    def __init__(self):
+        self._signatures = {}
+        self._due = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()         # serializes backups
+        self._start_lock = threading.Lock()   # thread start-up only; never waits on a backup
+
+    def enabled(self):
+        return STORAGE_MODE == "memory" and _BACKUP_OWNER == os.getpid()
+
+    def backup_all(self):
+        """Backs up every shard changed since its last backup; returns how many were."""
+        if not self.enabled():
+            return 0
+        done = 0
+        with self._lock:
+            for shard, working in enumerate(get_router().working_paths):
+                signature = _working_signature(working)
+                if self._signatures.get(working) == signature:
+                    continue
+                try:
+                    backup_shard(shard)
+                except (sqlite3.Error, OSError):
+                    METRICS.inc("svm_backup_failures_total")
+                    logging.exception(f"Shard {shard}: backup to disk failed")
+                    continue
+                self._signatures[working] = signature
+                done += 1
+            self._due = time.monotonic() + BACKUP_INTERVAL_S
+        return done
+
+    def run_if_due(self):
+        """For a loop that must not host threads (the pre-fork parent): backs up once the interval has passed."""
+        if time.monotonic() >= self._due:
+            self.backup_all()
+
+    def start(self):
+        """Starts the backup thread once per process, in the process that loaded the working copies."""
+        if not self.enabled() or (self._thread is not None and self._thread.is_alive()):
+            return  # fast path: runs on every request
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the backup thread and takes a final backup."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.backup_all()
+
+    def _run(self):
+        while not self._stop.wait(BACKUP_INTERVAL_S):
+            self.backup_all()
+
+
+BACKUPS = BackupScheduler()
+
+
+def release_working_copies():
+    """
+    Memory storage: frees the RAM held by working copies that no other process
+    is using and whose latest state is on disk. Anything else is left for the
+    next load to share or back up.
+    """
+    for shard, working in enumerate(get_router().working_paths):
+        lock = _WORKING_LOCKS.pop(working, None)
+        if lock is None:
+            continue
+        with lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+            if BACKUPS._signatures.get(working) != _working_signature(working):
+                continue
+            for f in (working, f"{working}-wal", f"{working}-shm", ledger_path(shard), f"{working}.lock"):
+                Path(f).unlink(missing_ok=True)
+
+
+@atexit.register
+def final_backup():
+    """Memory storage: backs the working copies up once more when the owning process exits."""
+    if BACKUPS.enabled():
+        BACKUPS.stop()
+        release_working_copies()
+
+
+# Schema migrations
+# schema_version holds the last migration applied to a database file. Each
+# step runs in its own transaction, and a step that returns a truthy value is
+# called again, so large tables are migrated in place a batch at a time
+# without holding the write lock for the whole conversion. The version is
+# recorded in the same transaction as the step's final batch.
+MIGRATION_BATCH = 20000
+
+
+def schema_version(conn):
+    """Returns the schema version of the database, 0 if it has never been migrated."""
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                 "version INTEGER NOT NULL)")
+    r = conn.execute("SELECT version FROM schema_version WHERE id = 1").fetchone()
+    return r["version"] if r else 0
+
+
+def _migration_step(conn, version, step):
+    """Runs one call of a migration step inside run_in_transaction(); returns True if it must run again."""
+    if schema_version(conn) >= version:
+        return False  # another process finished this migration first
+    if step(conn):
+        return True
+    conn.execute("INSERT INTO schema_version (id, version) VALUES (1, ?) "
+                 "ON CONFLICT(id) DO UPDATE SET version = excluded.version", (version,))
+    return False
+
+
+def migrate(conn):
+    """Applies every pending step of MIGRATIONS in order; returns the versions applied."""
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        logging.info(f"Applying schema migration {version}: {description}")
+        while run_in_transaction(conn, _migration_step, version, step):
+            pass
+        applied.append(version)
+    return applied
+
+
+def _create_tables(conn):
+    """Migration 1: the base tables as they stood before versioned migrations."""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS voters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            voter_id TEXT UNIQUE,
+            name TEXT,
+            dob TEXT,
+            phone TEXT,
+            fingerprint TEXT,
+            has_voted INTEGER DEFAULT 0,
+            created_at TEXT
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS votes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            voter_id TEXT,
+            candidate TEXT,
+            timestamp TEXT
+        )
+    """)
+    columns = {r["name"] for r in c.execute("PRAGMA table_info(voters)")}
+    if "fp_template" not in columns:
+        c.execute("ALTER TABLE voters ADD COLUMN fp_template BLOB")
+    # Indexes backing the admin voter list filters and counts.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_voters_name ON voters(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_voters_has_voted ON voters(has_voted)")
+    # Durable outbound SMS queue drained by SmsDispatcher.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS sms_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone TEXT NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            sent_at REAL,
+            last_error TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sms_outbox_due ON sms_outbox(status, next_attempt_at)")
+    # Idempotency log for offline kiosk batch uploads: one row per applied item.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS kiosk_sync (
+            kiosk_id TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            voter_id TEXT,
+            outcome TEXT NOT NULL,
+            received_at TEXT NOT NULL,
+            PRIMARY KEY (kiosk_id, idempotency_key)
+        ) WITHOUT ROWID
+    """)
+    # Small key/value counters, e.g. fp_generation (bumped on every template change).
+    c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID")
+    # Running totals, maintained in the same transaction as each votes insert.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS tallies (
+            candidate TEXT PRIMARY KEY,
+            votes INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+
+def _compact_votes(conn):
+    """
+    Migration 3: moves votes to integer candidate ids (referencing a new
+    candidates table) and integer epoch timestamps, and indexes them.
+    Copies one MIGRATION_BATCH of rows per call into votes_compact, keeping
+    the row ids; the last call swaps the tables and recounts the tallies.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS votes_compact (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            voter_id TEXT NOT NULL,
+            candidate_id INTEGER NOT NULL REFERENCES candidates(id),
+            cast_at INTEGER NOT NULL
+        )
+    """)
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM votes_compact").fetchone()[0]
+    end_id = conn.execute("SELECT MAX(id) FROM (SELECT id FROM votes WHERE id > ? ORDER BY id LIMIT ?)",
+                          (last_id, MIGRATION_BATCH)).fetchone()[0]
+    if end_id is not None:
+        conn.execute("INSERT OR IGNORE INTO candidates (name) SELECT DISTINCT COALESCE(candidate, '') FROM votes "
+                     "WHERE id > ? AND id <= ?", (last_id, end_id))
+        conn.execute("""
+            INSERT INTO votes_compact (id, voter_id, candidate_id, cast_at)
+            SELECT v.id, COALESCE(v.voter_id, ''), c.id, COALESCE(CAST(strftime('%s', v.timestamp) AS INTEGER), 0)
+            FROM votes v JOIN candidates c ON c.name = COALESCE(v.candidate, '')
+            WHERE v.id > ? AND v.id <= ? ORDER BY v.id
+        """, (last_id, end_id))
+        return True
+    conn.execute("DROP TABLE votes")
+    conn.execute("ALTER TABLE votes_compact RENAME TO votes")
+    conn.execute("CREATE INDEX idx_votes_voter_id ON votes(voter_id)")
+    conn.execute("CREATE INDEX idx_votes_candidate_cast_at ON votes(candidate_id, cast_at)")
+    conn.execute("CREATE INDEX idx_votes_cast_at ON votes(cast_at)")
+    # The votes table as exports and reports show it: candidate names and ISO times.
+    conn.execute("""
+        CREATE VIEW vote_ledger AS
+        SELECT v.id, v.voter_id, c.name AS candidate,
+               strftime('%Y-%m-%dT%H:%M:%S', v.cast_at, 'unixepoch') AS timestamp, v.cast_at
+        FROM votes v JOIN candidates c ON c.id = v.candidate_id
+    """)
+    conn.execute("DROP TABLE tallies")
+    conn.execute("""
+        CREATE TABLE tallies (
+            candidate_id INTEGER PRIMARY KEY REFERENCES candidates(id),
+            votes INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    rebuild_tallies(conn)
+    return False
+
+
+def _add_dob_int(conn):
+    """
+    Migration 4: adds the generated voters.dob_int column and its index, and
+    rewrites parseable but non-canonical DOBs (e.g. 1990-1-5) so they get one.
+    """
+    columns = {r["name"] for r in conn.execute("PRAGMA table_xinfo(voters)")}
+    if "dob_int" not in columns:
+        conn.execute(f"ALTER TABLE voters ADD COLUMN dob_int INTEGER GENERATED ALWAYS AS ({DOB_INT_SQL}) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_voters_dob_int_voted ON voters(dob_int, has_voted)")
+    rows = conn.execute("SELECT id, dob FROM voters WHERE dob_int IS NULL AND dob IS NOT NULL").fetchall()
+    conn.executemany("UPDATE voters SET dob=? WHERE id=?",
+                     [(canonical_dob(r["dob"]), r["id"]) for r in rows if parse_dob(r["dob"])])
+    return False
+
+
+def _add_voter_search(conn):
+    """
+    Migration 5: a trigram FTS5 index over voters' name, voter_id and phone for
+    substring and fuzzy admin search, kept in sync by triggers. Votes only
+    update has_voted, which the update trigger does not watch.
+    """
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS voters_fts USING fts5("
+                 "name, voter_id, phone, content='voters', content_rowid='id', tokenize='trigram')")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS voters_fts_insert AFTER INSERT ON voters BEGIN
+            INSERT INTO voters_fts (rowid, name, voter_id, phone) VALUES (new.id, new.name, new.voter_id, new.phone);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS voters_fts_delete AFTER DELETE ON voters BEGIN
+            INSERT INTO voters_fts (voters_fts, rowid, name, voter_id, phone)
+            VALUES ('delete', old.id, old.name, old.voter_id, old.phone);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS voters_fts_update AFTER UPDATE OF name, voter_id, phone ON voters BEGIN
+            INSERT INTO voters_fts (voters_fts, rowid, name, voter_id, phone)
+            VALUES ('delete', old.id, old.name, old.voter_id, old.phone);
+            INSERT INTO voters_fts (rowid, name, voter_id, phone) VALUES (new.id, new.name, new.voter_id, new.phone);
+        END
+    """)
+    conn.execute("INSERT INTO voters_fts (voters_fts) VALUES ('rebuild')")
+    return False
+
+
+# (version, description, step); append only, never renumber or edit a shipped step.
+MIGRATIONS = (
+    (1, "base tables", _create_tables),
+    (2, "fingerprint text to template BLOBs", lambda conn: _convert_text_fingerprints(conn)),
+    (3, "votes with candidate ids, epoch timestamps and indexes", _compact_votes),
+    (4, "generated voters.dob_int with an eligibility index", _add_dob_int),
+    (5, "trigram full-text index for voter search", _add_voter_search),
+)
+
+
+# Tallies
+def get_tallies(conn):
+    """Returns {candidate: votes} from the tallies table; O(number of candidates)."""
+    rows = conn.execute("SELECT c.name, t.votes FROM tallies t JOIN candidates c ON c.id = t.candidate_id "
+                        "ORDER BY c.name")
+    return {name: votes for name, votes in rows}
+
+
+def recount_votes(conn):
+    """Returns {candidate: votes} by counting the votes table (an index-only scan)."""
+    rows = conn.execute("SELECT c.name, n FROM (SELECT candidate_id, COUNT(*) AS n FROM votes GROUP BY candidate_id) "
+                        "JOIN candidates c ON c.id = candidate_id ORDER BY c.name")
+    return {name: n for name, n in rows}
+
+
+def rebuild_tallies(conn):
+    """Replaces the tallies with a full recount; must run inside run_in_transaction()."""
+    conn.execute("DELETE FROM tallies")
+    conn.execute("INSERT INTO tallies (candidate_id, votes) SELECT candidate_id, COUNT(*) FROM votes "
+                 "GROUP BY candidate_id")
+
+
+def candidate_id(conn, name):
+    """Returns the candidates.id for name, adding the candidate on first use; inside a transaction."""
+    r = conn.execute("SELECT id FROM candidates WHERE name=?", (name,)).fetchone()
+    if r:
+        return r[0]
+    return conn.execute("INSERT INTO candidates (name) VALUES (?)", (name,)).lastrowid
+
+
+def check_tallies(conn):
+    """Compares the tallies against a full recount; returns {candidate: (tally, recount)} for mismatches."""
+    tallies = get_tallies(conn)
+    recount = recount_votes(conn)
+    return {c: (tallies.get(c, 0), recount.get(c, 0))
+            for c in sorted(set(tallies) | set(recount)) if tallies.get(c, 0) != recount.get(c, 0)}
+
+
+def all_tallies():
+    """Returns {candidate: votes} summed over every shard."""
+    totals = {}
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            for candidate, n in get_tallies(conn).items():
+                totals[candidate] = totals.get(candidate, 0) + n
+    return dict(sorted(totals.items()))
+
+
+def check_all_tallies():
+    """Runs check_tallies() on every shard; returns {candidate: (tally, recount)} summed over mismatching shards."""
+    mismatches = {}
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            for candidate, (t, n) in check_tallies(conn).items():
+                prev_t, prev_n = mismatches.get(candidate, (0, 0))
+                mismatches[candidate] = (prev_t + t, prev_n + n)
+    return mismatches
+
+
+# Utility functions
+def epoch_from_iso(text):
+    """Parses an ISO 8601 timestamp (naive means UTC) to integer epoch seconds; raises ValueError."""
+    dt = datetime.fromisoformat(str(text))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def utc_iso(text):
+    """Parses an ISO 8601 timestamp (naive means UTC) to the naive UTC ISO text created_at holds; raises ValueError."""
+    dt = datetime.fromisoformat(str(text))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def iso_from_epoch(ts):
+    """Formats epoch seconds as a naive UTC ISO timestamp, the format votes have always been reported in."""
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+@lru_cache(maxsize=65536)
+def parse_dob(dob_str):
+    """Parses a YYYY-MM-DD date string; returns None if it is not a valid date. Cached: rolls repeat DOBs a lot."""
+    try:
+        return datetime.strptime(dob_str, "%Y-%m-%d").date()
+    except Exception:
+        return None
+
+
+def canonical_dob(dob_str):
+    """Returns dob_str rewritten as zero-padded YYYY-MM-DD if it parses, else unchanged."""
+    dob = parse_dob(dob_str)
+    return dob.isoformat() if dob else dob_str
+
+
+# Eligibility
+# voters.dob_int is a generated YYYYMMDD integer (NULL for a missing or
+# invalid DOB), indexed together with has_voted. A voter is eligible when
+# dob_int <= the cutoff for election day, so verification is one integer
+# comparison and eligibility counts are index range scans.
+VOTING_AGE = 18
+ELECTION_DAY = os.environ.get("SVM_ELECTION_DAY", "")  # YYYY-MM-DD; empty means the current UTC date
+DOB_INT_SQL = ("CASE WHEN dob GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' AND date(dob, '+0 days') IS dob "
+               "THEN CAST(replace(dob, '-', '') AS INTEGER) END")
+
+
+def election_day():
+    """Returns the election date: SVM_ELECTION_DAY if set, else today (UTC)."""
+    return parse_dob(ELECTION_DAY) or datetime.utcnow().date()
+
+
+def date_int(day):
+    """Returns a date as a YYYYMMDD integer, comparable with voters.dob_int."""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def eligibility_cutoff(day=None):
+    """Returns the latest dob_int that is VOTING_AGE years old on `day` (default: election day)."""
+    day = day or election_day()
+    return (day.year - VOTING_AGE) * 10000 + day.month * 100 + day.day
+
+
+def age_from_dob_int(dob_int, day=None):
+    """Age in whole years on `day` (default: election day); -1 for a missing DOB."""
+    if dob_int is None:
+        return -1
+    return (date_int(day or election_day()) - dob_int) // 10000
+
+
+def send_sms(to_number, message):
+    """
+    Simulates sending an SMS notification.
+    In a real-world scenario, this would use a service like Twilio or Vonage.
+    For this demo, we'll log the message to the console.
+    """
+    logging.info(f"Simulating SMS to {to_number}: {message}")
+
+
+# --------------------
+# Outbound SMS queue
+# --------------------
+# Votes only enqueue their SMS (in the vote's own transaction); a pool of
+# background workers delivers them, so vote latency never waits on a gateway.
+SMS_WORKERS = int(os.environ.get("SVM_SMS_WORKERS", "2"))
+SMS_BATCH_SIZE = 50
+SMS_RATE_PER_S = float(os.environ.get("SVM_SMS_RATE", "20"))  # 0 or less: unlimited
+SMS_MAX_ATTEMPTS = 5
+SMS_RETRY_BASE_S = 2.0
+SMS_LEASE_S = 60.0          # a claimed batch not completed within this is handed out again
+SMS_POLL_INTERVAL_S = 1.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, n=1):
+        """Takes n tokens if available; otherwise returns the seconds until they will be."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            return (n - self._tokens) / self.rate
+
+    def acquire(self, n=1, stop=None):
+        """Blocks until n tokens are taken; returns False if `stop` (an Event) is set first."""
+        while True:
+            wait = self.try_acquire(n)
+            if not wait:
+                return True
+            if stop is not None and stop.wait(wait):
+                return False
+            if stop is None:
+                time.sleep(wait)
+
+
+class StubSmsGateway:
+    """
+    Local stand-in for a real SMS provider: delivers via send_sms() and keeps
+    the sent messages in memory. fail_every=N makes every Nth send fail, to
+    exercise retries.
+    """
+
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self.sent = []
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        """Sends [(id, phone, message)]; returns {id: error or None}."""
+        results = {}
+        for msg_id, phone, message in messages:
+            with self._lock:
+                self._calls += 1
+                failed = self.fail_every and self._calls % self.fail_every == 0
+                if not failed:
+                    self.sent.append((phone, message))
+            if failed:
+                results[msg_id] = "stub_gateway_failure"
+            else:
+                send_sms(phone, message)
+                results[msg_id] = None
+        return results
+
+
+def enqueue_sms(conn, phone, message):
+    """Queues an SMS; call inside the transaction that produced it."""
+    now = time.time()
+    conn.execute("INSERT INTO sms_outbox (phone, message, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                 (phone, message, now, now))
+
+
+def _claim_sms_batch(conn, limit, now):
+    """Leases up to `limit` due messages (pending, or sending with an expired lease); inside run_in_transaction()."""
+    rows = conn.execute(
+        "SELECT id, phone, message FROM sms_outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? "
+        "ORDER BY next_attempt_at LIMIT ?", (now, limit)).fetchall()
+    conn.executemany("UPDATE sms_outbox SET status='sending', next_attempt_at=? WHERE id=?",
+                     [(now + SMS_LEASE_S, r["id"]) for r in rows])
+    return [(r["id"], r["phone"], r["message"]) for r in rows]
+
+
+def _complete_sms_batch(conn, results, now):
+    """Marks delivered messages sent and schedules retries with exponential backoff; inside run_in_transaction()."""
+    for msg_id, error in results.items():
+        if error is None:
+            conn.execute("UPDATE sms_outbox SET status='sent', sent_at=?, attempts=attempts+1, last_error=NULL "
+                         "WHERE id=?", (now, msg_id))
+            continue
+        attempts = conn.execute("SELECT attempts FROM sms_outbox WHERE id=?", (msg_id,)).fetchone()["attempts"] + 1
+        if attempts >= SMS_MAX_ATTEMPTS:
+            conn.execute("UPDATE sms_outbox SET status='failed', attempts=?, last_error=? WHERE id=?",
+                         (attempts, error, msg_id))
+        else:
+            retry_at = now + SMS_RETRY_BASE_S * (2 ** (attempts - 1))
+            conn.execute("UPDATE sms_outbox SET status='pending', attempts=?, next_attempt_at=?, last_error=? "
+                         "WHERE id=?", (attempts, retry_at, error, msg_id))
+
+
+def sms_queue_stats():
+    """Queue depth, delivery lag and outcome counts over all shards, for monitoring."""
+    now = time.time()
+    counts, oldest = {}, None
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            for r in conn.execute("SELECT status, COUNT(*) AS n FROM sms_outbox GROUP BY status"):
+                counts[r["status"]] = counts.get(r["status"], 0) + r["n"]
+            first = conn.execute(
+                "SELECT MIN(created_at) FROM sms_outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+            if first is not None and (oldest is None or first < oldest):
+                oldest = first
+    return {
+        "pending": counts.get("pending", 0) + counts.get("sending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_age_s": round(now - oldest, 3) if oldest else 0.0,
+        "last_delivery_lag_s": SMS_DISPATCHER.last_delivery_lag,
+    }
+
+
+class SmsDispatcher:
+    """Background worker pool that drains sms_outbox in rate-limited batches."""
+
+    def __init__(self, gateway, workers=SMS_WORKERS, batch_size=SMS_BATCH_SIZE, rate_per_s=SMS_RATE_PER_S):
+        self.gateway = gateway
+        self.workers = workers
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(rate_per_s, max(rate_per_s, batch_size)) if rate_per_s > 0 else None
+        self.last_delivery_lag = 0.0
+        self._next_shard = 0
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker threads once per process."""
+        if any(t.is_alive() for t in self._threads):
+            return  # fast path: runs on every request
+        with self._lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._run, name=f"sms-worker-{n}", daemon=True)
+                             for n in range(self.workers)]
+            for t in self._threads:
+                t.start()
+
+    def stop(self, timeout=5.0):
+        """Signals the workers to finish their current batch and waits for them."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def wake(self):
+        """Nudges idle workers after an enqueue instead of waiting for the next poll."""
+        self._wake.set()
+
+    def drain_once(self):
+        """Drains one batch from each shard, starting round-robin; returns the number of messages handled."""
+        shards = list(all_shards())
+        with self._lock:
+            start = self._next_shard % len(shards)
+            self._next_shard += 1
+        return sum(self._drain_shard(shard) for shard in shards[start:] + shards[:start])
+
+    def _drain_shard(self, shard):
+        """Claims, sends and completes one batch from one shard."""
+        with db_conn(shard) as conn:
+            batch = run_in_transaction(conn, _claim_sms_batch, self.batch_size, time.time())
+            if not batch:
+                return 0
+            if self.bucket is not None and not self.bucket.acquire(len(batch), self._stop):
+                return 0  # shutting down; the batch is handed out again when its lease expires
+            results = self.gateway.send_batch(batch)
+            now = time.time()
+            run_in_transaction(conn, _complete_sms_batch, results, now)
+            sent = [m for m in batch if results.get(m[0], "") is None]
+            if sent:
+                created = conn.execute("SELECT created_at FROM sms_outbox WHERE id=?", (sent[-1][0],)).fetchone()[0]
+                self.last_delivery_lag = round(now - created, 3)
+            return len(results)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.drain_once()
+            except Exception:
+                logging.exception("SMS worker failed to drain the outbox")
+                handled = 0
+            if not handled:
+                self._wake.wait(SMS_POLL_INTERVAL_S)
+                self._wake.clear()
+
+
+SMS_DISPATCHER = SmsDispatcher(StubSmsGateway())
+atexit.register(SMS_DISPATCHER.stop)
+
+
+# --------------------
+# Hash-chained vote ledger
+# --------------------
+# Every recorded vote is also appended to <db stem>.ledger, one JSON line per
+# vote, each carrying the SHA-256 of the previous line so that rewriting or
+# dropping a past vote breaks the chain. The ledger writer tails the votes
+# table of each shard (by vote id) rather than taking votes from memory, so a
+# crash can delay a vote's ledger line but never lose it. Appends from all
+# processes are serialized with an exclusive flock on the file, and each pass
+# writes every pending vote with a single fsync (group commit).
+# `python smart_voting_system.py verify-ledger` checks the chain against votes.
+LEDGER_ENABLED = os.environ.get("SVM_LEDGER", "1") != "0"
+LEDGER_BATCH = 5000
+LEDGER_GROUP_WINDOW_S = 0.005   # after a wake-up, wait this long for more votes to share the fsync
+LEDGER_POLL_INTERVAL_S = 1.0
+LEDGER_GENESIS = "0" * 64
+LEDGER_FIELDS = ("seq", "vote_id", "voter_id", "candidate", "cast_at")
+
+
+def ledger_path(shard):
+    """The ledger file of a shard, next to its (working) database file."""
+    return get_router().working_paths[shard].with_suffix(".ledger")
+
+
+def ledger_hash(prev, record):
+    """SHA-256 over the previous hash and the record's fields, in a fixed encoding."""
+    body = json.dumps([record[f] for f in LEDGER_FIELDS], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{prev}\n{body}".encode("utf-8")).hexdigest()
+
+
+def _ledger_tail(f):
+    """
+    Returns the last record of an open ledger (or None if empty), first cutting
+    off a torn final line left by a crash mid-write; caller holds the flock.
+    """
+    end = f.seek(0, os.SEEK_END)
+    if not end:
+        return None
+    block = min(end, 65536)
+    f.seek(end - block)
+    tail = f.read(block)
+    cut = tail.rfind(b"\n") + 1
+    if cut < len(tail):
+        logging.warning(f"Ledger {f.name}: truncating a torn final record")
+        f.truncate(end - block + cut)
+        tail = tail[:cut]
+    lines = tail.rstrip(b"\n").rsplit(b"\n", 1)
+    return json.loads(lines[-1]) if lines[-1] else None
+
+
+class LedgerWriter:
+    """Background thread that appends newly recorded votes to each shard's ledger."""
+
+    def __init__(self, batch_size=LEDGER_BATCH):
+        self.batch_size = batch_size
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._append_lock = threading.Lock()  # serializes appends; never held by start()
+
+    def start(self):
+        """Starts the writer thread once per process."""
+        if self._thread is not None and self._thread.is_alive():
+            return  # fast path: runs on every request
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flushes pending votes and stops the writer thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Nudges the writer after a vote commits instead of waiting for the next poll."""
+        self._wake.set()
+
+    def flush(self):
+        """Appends every pending vote of every shard; returns the number of records written."""
+        return sum(self.append_pending(shard) for shard in all_shards())
+
+    def append_pending(self, shard):
+        """Appends the shard's votes newer than its ledger's last record, one fsync per batch."""
+        written = 0
+        with self._append_lock, db_conn(shard) as conn, open(ledger_path(shard), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            last = _ledger_tail(f)
+            seq, vote_id, prev = (last["seq"], last["vote_id"], last["hash"]) if last else (0, 0, LEDGER_GENESIS)
+            while True:
+                rows = conn.execute("SELECT id, voter_id, candidate, cast_at FROM vote_ledger WHERE id > ? "
+                                    "ORDER BY id LIMIT ?", (vote_id, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                lines = []
+                for r in rows:
+                    seq += 1
+                    record = {"seq": seq, "vote_id": r["id"], "voter_id": r["voter_id"],
+                              "candidate": r["candidate"], "cast_at": r["cast_at"]}
+                    record["prev"], record["hash"] = prev, ledger_hash(prev, record)
+                    prev, vote_id = record["hash"], r["id"]
+                    lines.append(json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+                f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                f.flush()
+                started = time.perf_counter()
+                os.fsync(f.fileno())
+                METRICS.observe("svm_ledger_fsync_seconds", time.perf_counter() - started)
+                METRICS.inc("svm_ledger_records_total", len(rows))
+                written += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        return written
+
+    def _run(self):
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Ledger writer failed to append votes")
+            if stopping:
+                return
+            if self._wake.wait(LEDGER_POLL_INTERVAL_S):
+                self._stop.wait(LEDGER_GROUP_WINDOW_S)
+            self._wake.clear()
+
+
+LEDGER_WRITER = LedgerWriter()
+
+
+def ledger_head(shard):
+    """Returns the last record of a shard's ledger, or None; publish it to anchor the chain externally."""
+    path = ledger_path(shard)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(0, end - 65536))
+        tail = f.read()
+    # Anything after the last newline is a torn write the writer will cut off.
+    lines = tail[:tail.rfind(b"\n") + 1].rstrip(b"\n").rsplit(b"\n", 1)
+    return json.loads(lines[-1]) if lines[-1] else None
+
+
+def verify_ledger(shard, max_errors=100):
+    """
+    Streams a shard's ledger, re-computing the hash chain, and merge-joins it
+    against the votes table by vote id. Reports chain breaks, votes deleted or
+    altered since they were ledgered, votes missing from the ledger, and votes
+    newer than the ledger head (still pending).
+    """
+    report = {"shard": shard, "ledger": str(ledger_path(shard)), "records": 0, "chain_breaks": 0, "deleted": 0,
+              "altered": 0, "missing": 0, "pending": 0, "head": None, "errors": []}
+
+    def error(kind, **detail):
+        report[kind] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append(dict(kind=kind, **detail))
+
+    def db_votes(conn):
+        cur = conn.execute("SELECT id, voter_id, candidate, cast_at FROM vote_ledger ORDER BY id")
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    with db_conn(shard) as conn:
+        votes = db_votes(conn)
+        vote = next(votes, None)
+        prev, seq = LEDGER_GENESIS, 0
+        path = ledger_path(shard)
+        lines = open(path, "rb") if path.exists() else io.BytesIO()
+        with lines:
+            for line_no, line in enumerate(lines, 1):
+                if not line.endswith(b"\n"):
+                    break  # torn final line of an interrupted write; not yet part of the ledger
+                try:
+                    record = json.loads(line)
+                    expected = ledger_hash(record["prev"], record)
+                except (ValueError, KeyError):
+                    error("chain_breaks", line=line_no, detail="unparseable record")
+                    continue
+                report["records"] += 1
+                if record["prev"] != prev or record["seq"] != seq + 1 or record["hash"] != expected:
+                    error("chain_breaks", line=line_no, seq=record.get("seq"))
+                prev, seq = record["hash"], record["seq"]
+                while vote is not None and vote["id"] < record["vote_id"]:
+                    error("missing", vote_id=vote["id"])
+                    vote = next(votes, None)
+                if vote is None or vote["id"] != record["vote_id"]:
+                    error("deleted", vote_id=record["vote_id"])
+                    continue
+                if (vote["voter_id"], vote["candidate"], vote["cast_at"]) != \
+                        (record["voter_id"], record["candidate"], record["cast_at"]):
+                    error("altered", vote_id=vote["id"])
+                report["head"] = {"seq": seq, "vote_id": record["vote_id"], "hash": prev}
+                vote = next(votes, None)
+        while vote is not None:
+            report["pending"] += 1
+            vote = next(votes, None)
+    report["ok"] = not (report["chain_breaks"] or report["deleted"] or report["altered"] or report["missing"])
+    return report
+
+
+# --------------------
+# Fingerprint matching
+# --------------------
+# Templates are fixed-length uint8 feature vectors stored as BLOBs
+# (FP_DIM bytes each). A probe matches when its cosine similarity to the
+# enrolled template, after centring both on the byte midpoint, reaches
+# FP_MATCH_THRESHOLD. Several captures of one finger can be scored in a
+# single matrix-vector product.
+FP_DIM = 256
+FP_MATCH_THRESHOLD = float(os.environ.get("SVM_FP_THRESHOLD", "0.90"))
+FP_MAX_CAPTURES = 8
+FP_CONVERT_BATCH = 5000
+
+
+def _fp_number(value):
+    """True for a template value: a number, or a string of one ("12", "0.5")."""
+    if isinstance(value, str):
+        return value.strip().replace(".", "", 1).isdigit()
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _fp_is_float(value):
+    return isinstance(value, float) or (isinstance(value, str) and "." in value)
+
+
+def fp_features(payload):
+    """
+    Converts a scanner payload to a uint8 feature vector of length FP_DIM.
+    Accepted payloads: a list of FP_DIM numbers or numeric strings (0-255, or
+    0-1 floats), the same as a comma/space separated string, or base64 of FP_DIM
+    raw bytes. Any other string is treated as a legacy text placeholder and
+    expanded deterministically with SHAKE-256, so typing the enrolled text still
+    verifies in the demo. Raises ValueError for a list of the wrong length or of non-numbers.
+    """
+    if isinstance(payload, (list, tuple)):
+        try:
+            values = np.asarray(payload, dtype=np.float32)
+        except TypeError:
+            raise ValueError("fingerprint template values must be numbers") from None
+        floats = any(_fp_is_float(v) for v in payload)
+    else:
+        text = str(payload).strip()
+        tokens = text.replace(",", " ").split()
+        if len(tokens) == FP_DIM and all(_fp_number(t) for t in tokens):
+            values = np.array(tokens, dtype=np.float32)
+            floats = any(_fp_is_float(t) for t in tokens)
+        else:
+            try:
+                raw = base64.b64decode(text, validate=True)
+            except (binascii.Error, ValueError):
+                raw = b""
+            if len(raw) != FP_DIM:
+                raw = hashlib.shake_256(text.encode("utf-8")).digest(FP_DIM)
+            return np.frombuffer(raw, dtype=np.uint8)
+    if values.shape != (FP_DIM,):
+        raise ValueError(f"fingerprint template must have {FP_DIM} values")
+    if not np.isfinite(values).all():
+        raise ValueError("fingerprint template values must be numbers")
+    if floats and values.max() <= 1.0:
+        values = values * 255.0  # 0-1 floats; integer templates of only 0s and 1s are left alone
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+def fp_template_blob(payload):
+    """Returns the BLOB to store for an enrollment payload, or None for an empty one."""
+    if payload is None or (isinstance(payload, str) and not payload.strip()):
+        return None
+    return fp_features(payload).tobytes()
+
+
+def _fp_normalize(matrix):
+    """Centres uint8 feature rows on the midpoint and scales them to unit length (float32)."""
+    centred = np.asarray(matrix, dtype=np.float32) - 127.5
+    norms = np.linalg.norm(centred, axis=-1, keepdims=True)
+    return centred / np.maximum(norms, 1e-6)
+
+
+def fp_probe_matrix(fp_payload):
+    """
+    Turns one capture or a list of captures into a (k, FP_DIM) uint8 matrix. A
+    flat list of numbers or numeric strings is one template, as fp_features()
+    reads it at enrollment.
+    """
+    if isinstance(fp_payload, (list, tuple)) and fp_payload and isinstance(fp_payload[0], (str, list, tuple)) \
+            and not all(_fp_number(v) for v in fp_payload):
+        captures = list(fp_payload)[:FP_MAX_CAPTURES]
+    else:
+        captures = [fp_payload]
+    return np.stack([fp_features(c) for c in captures])
+
+
+def fp_scores(template, probes):
+    """Cosine similarities of each probe row against one stored template BLOB."""
+    stored = _fp_normalize(np.frombuffer(template, dtype=np.uint8))
+    return _fp_normalize(probes) @ stored
+
+
+def fp_verify(template, fp_payload, threshold=None):
+    """True if any capture in fp_payload matches the stored template."""
+    if not template:
+        return False
+    scores = fp_scores(template, fp_probe_matrix(fp_payload))
+    return bool(scores.max() >= (FP_MATCH_THRESHOLD if threshold is None else threshold))
+
+
+def _convert_text_fingerprints(conn):
+    """
+    Converts one batch of legacy TEXT fingerprints to template BLOBs and clears
+    the text; inside run_in_transaction(). Returns the number converted.
+    """
+    rows = conn.execute("SELECT id, fingerprint FROM voters WHERE fingerprint IS NOT NULL AND fp_template IS NULL "
+                        "LIMIT ?", (FP_CONVERT_BATCH,)).fetchall()
+    updates = []
+    for r in rows:
+        try:
+            updates.append((fp_template_blob(r["fingerprint"]), r["id"]))
+        except ValueError:
+            updates.append((None, r["id"]))
+            logging.warning(f"Voter row {r['id']} has an unusable fingerprint template; it must be re-enrolled.")
+    conn.executemany("UPDATE voters SET fp_template=?, fingerprint=NULL WHERE id=?", updates)
+    if updates:
+        bump_fp_generation(conn)
+    return len(updates)
+
+
+# --------------------
+# Fingerprint duplicate-enrollment index (1:N)
+# --------------------
+# Every enrolled template is kept in memory as uint8 rows plus random-hyperplane
+# LSH signatures (FP_LSH_TABLES tables of FP_LSH_BITS bits). A query compares
+# signatures for all rows in one vectorized pass and scores only the rows
+# sharing a bucket in some table. The index is persisted next to the database
+# together with meta.fp_generation, so startup reloads it instead of rebuilding
+# unless the templates have changed since.
+FP_DUPLICATE_THRESHOLD = float(os.environ.get("SVM_FP_DUP_THRESHOLD", str(FP_MATCH_THRESHOLD)))
+FP_LSH_TABLES = 16
+FP_LSH_BITS = 10
+FP_LSH_SEED = 20240501
+FP_INDEX_LOAD_BATCH = 50000
+FP_KEY_SHARD_BITS = 8  # index keys are (voters.id << 8) | shard
+
+
+def fp_key(shard, row_id):
+    """Packs a shard and voters.id into one fingerprint index key."""
+    return (int(row_id) << FP_KEY_SHARD_BITS) | shard
+
+
+def fp_unkey(key):
+    """Splits an index key into (shard, voters.id)."""
+    return key & ((1 << FP_KEY_SHARD_BITS) - 1), key >> FP_KEY_SHARD_BITS
+
+
+def get_fp_generation(conn):
+    """Returns the template change counter."""
+    r = conn.execute("SELECT value FROM meta WHERE key='fp_generation'").fetchone()
+    return r["value"] if r else 0
+
+
+def bump_fp_generation(conn):
+    """Increments the template change counter; call in the transaction that changed templates."""
+    conn.execute("INSERT INTO meta (key, value) VALUES ('fp_generation', 1) "
+                 "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+    return get_fp_generation(conn)
+
+
+class FingerprintIndex:
+    """In-memory LSH index over all enrolled templates of all shards, keyed by fp_key()."""
+
+    def __init__(self, dim=FP_DIM, tables=FP_LSH_TABLES, bits=FP_LSH_BITS, seed=FP_LSH_SEED):
+        rng = np.random.default_rng(seed)
+        self.dim, self.tables, self.bits = dim, tables, bits
+        self._planes = rng.standard_normal((dim, tables * bits)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.uint16)
+        self._lock = threading.RLock()
+        self.generation = None
+        self._reset()
+
+    def _reset(self, capacity=1024):
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._templates = np.zeros((capacity, self.dim), dtype=np.uint8)
+        self._sigs = np.zeros((capacity, self.tables), dtype=np.uint16)
+        self._pos = {}
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def _signatures(self, templates):
+        """LSH signatures, shape (k, tables), for a (k, dim) uint8 matrix."""
+        bits = (_fp_normalize(templates) @ self._planes) > 0
+        return (bits.reshape(len(templates), self.tables, self.bits) * self._weights).sum(axis=2).astype(np.uint16)
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._ids = np.resize(self._ids, capacity)
+        self._templates = np.resize(self._templates, (capacity, self.dim))
+        self._sigs = np.resize(self._sigs, (capacity, self.tables))
+
+    def add_many(self, keys, templates):
+        """Adds or replaces templates for the given keys; templates is (k, dim) uint8."""
+        if not len(keys):
+            return
+        sigs = self._signatures(templates)
+        with self._lock:
+            for key, template, sig in zip(keys, templates, sigs):
+                pos = self._pos.get(int(key))
+                if pos is None:
+                    self._grow(self._n + 1)
+                    pos = self._pos[int(key)] = self._n
+                    self._n += 1
+                self._ids[pos] = key
+                self._templates[pos] = template
+                self._sigs[pos] = sig
+
+    def add(self, key, template):
+        """Adds or replaces one template BLOB."""
+        self.add_many([key], np.frombuffer(template, dtype=np.uint8)[None, :])
+
+    def remove(self, key):
+        """Removes a key by moving the last row into its slot."""
+        with self._lock:
+            pos = self._pos.pop(int(key), None)
+            if pos is None:
+                return
+            last = self._n - 1
+            if pos != last:
+                self._ids[pos] = self._ids[last]
+                self._templates[pos] = self._templates[last]
+                self._sigs[pos] = self._sigs[last]
+                self._pos[int(self._ids[pos])] = pos
+            self._n = last
+
+    def query(self, template, threshold=None, exclude=None, limit=10):
+        """Returns [(key, score)] of enrolled templates matching `template`, best first."""
+        threshold = FP_DUPLICATE_THRESHOLD if threshold is None else threshold
+        probe = np.frombuffer(template, dtype=np.uint8)[None, :]
+        sig = self._signatures(probe)[0]
+        with self._lock:
+            n = self._n
+            candidates = np.flatnonzero((self._sigs[:n] == sig).any(axis=1))
+            if not len(candidates):
+                return []
+            scores = _fp_normalize(self._templates[candidates]) @ _fp_normalize(probe)[0]
+            ids = self._ids[candidates]
+        keep = scores >= threshold
+        if exclude is not None:
+            keep &= ids != exclude
+        order = np.argsort(-scores[keep])[:limit]
+        return [(int(i), round(float(sc), 4)) for i, sc in zip(ids[keep][order], scores[keep][order])]
+
+    def find_duplicates(self, threshold=None):
+        """Returns [(key_a, key_b, score)] for every pair of enrolled templates above threshold."""
+        threshold = FP_DUPLICATE_THRESHOLD if threshold is None else threshold
+        with self._lock:
+            n = self._n
+            ids, templates, sigs = self._ids[:n].copy(), self._templates[:n].copy(), self._sigs[:n].copy()
+        pairs = {}
+        for t in range(self.tables):
+            order = np.argsort(sigs[:, t], kind="stable")
+            keys = sigs[order, t]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            ends = np.r_[starts[1:], n]
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                members = order[start:end]
+                normed = _fp_normalize(templates[members])
+                gram = normed @ normed.T
+                for a, b in zip(*np.nonzero(np.triu(gram >= threshold, k=1))):
+                    key = tuple(sorted((int(ids[members[a]]), int(ids[members[b]]))))
+                    pairs[key] = round(float(gram[a, b]), 4)
+        return sorted(((a, b, sc) for (a, b), sc in pairs.items()), key=lambda p: -p[2])
+
+    def rebuild(self):
+        """Reloads every template of every shard in batches."""
+        with self._lock:
+            self._reset()
+            generation = []
+            for shard in all_shards():
+                with db_conn(shard) as conn:
+                    generation.append(get_fp_generation(conn))
+                    last_id = 0
+                    while True:
+                        rows = conn.execute(
+                            "SELECT id, fp_template FROM voters WHERE fp_template IS NOT NULL AND id > ? "
+                            "ORDER BY id LIMIT ?", (last_id, FP_INDEX_LOAD_BATCH)).fetchall()
+                        if not rows:
+                            break
+                        templates = np.frombuffer(b"".join(r["fp_template"] for r in rows), dtype=np.uint8)
+                        self.add_many([fp_key(shard, r["id"]) for r in rows], templates.reshape(len(rows), self.dim))
+                        last_id = rows[-1]["id"]
+            self.generation = tuple(generation)
+
+    def save(self, path):
+        """Writes the index and its generation to an .npz file."""
+        with self._lock:
+            n = self._n
+            tmp = Path(f"{path}.{os.getpid()}.tmp")  # workers may save concurrently
+            with open(tmp, "wb") as f:
+                np.savez(f, ids=self._ids[:n], templates=self._templates[:n], sigs=self._sigs[:n],
+                         generation=np.array(self.generation or (), dtype=np.int64),
+                         shape=np.array([self.dim, self.tables, self.bits, FP_LSH_SEED]))
+            os.replace(tmp, path)
+
+    def load(self, path, generation):
+        """Loads a saved index if it was written at `generation` (one counter per shard); returns True on success."""
+        try:
+            with np.load(path) as data:
+                if (tuple(np.atleast_1d(data["generation"]).tolist()) != generation or
+                        data["shape"].tolist() != [self.dim, self.tables, self.bits, FP_LSH_SEED]):
+                    return False
+                ids, templates, sigs = data["ids"], data["templates"], data["sigs"]
+        except (OSError, KeyError, ValueError):
+            return False
+        with self._lock:
+            self._reset(max(1024, len(ids)))
+            n = len(ids)
+            self._ids[:n], self._templates[:n], self._sigs[:n] = ids, templates, sigs
+            self._pos = {int(i): p for p, i in enumerate(ids)}
+            self._n = n
+            self.generation = generation
+        return True
+
+
+FP_INDEX = FingerprintIndex()
+
+
+def fp_index_path():
+    """Where the fingerprint index is persisted, next to the database."""
+    return DB_PATH.with_name(DB_PATH.stem + ".fpindex.npz")
+
+
+def fp_generations():
+    """Returns the template change counters of all shards as a tuple."""
+    generation = []
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            generation.append(get_fp_generation(conn))
+    return tuple(generation)
+
+
+def get_fp_index():
+    """
+    Returns FP_INDEX, brought up to date with the database: reloaded from disk
+    or rebuilt if another process (or a bulk import) changed the templates.
+    """
+    generation = fp_generations()
+    if FP_INDEX.generation != generation:
+        with FP_INDEX._lock:
+            if FP_INDEX.generation != generation and not FP_INDEX.load(fp_index_path(), generation):
+                FP_INDEX.rebuild()
+                save_fp_index()
+    return FP_INDEX
+
+
+def fp_index_apply(shard, row_id, template, generation):
+    """Applies one committed template change (template None means removed) to an up-to-date index."""
+    with FP_INDEX._lock:
+        current = FP_INDEX.generation
+        if current is None or len(current) != NUM_SHARDS or current[shard] != generation - 1:
+            get_fp_index()  # missed someone else's change as well; resync from the database
+            return
+        if template:
+            FP_INDEX.add(fp_key(shard, row_id), template)
+        else:
+            FP_INDEX.remove(fp_key(shard, row_id))
+        FP_INDEX.generation = current[:shard] + (generation,) + current[shard + 1:]
+
+
+def _fp_voter_ids(keys):
+    """Maps index keys to voter_ids, one chunked lookup per shard."""
+    by_shard = {}
+    for key in keys:
+        shard, row_id = fp_unkey(key)
+        by_shard.setdefault(shard, []).append(row_id)
+    names = {}
+    for shard, row_ids in by_shard.items():
+        with db_conn(shard) as conn:
+            for i in range(0, len(row_ids), _SQL_IN_CHUNK):
+                chunk = row_ids[i:i + _SQL_IN_CHUNK]
+                names.update((fp_key(shard, r["id"]), r["voter_id"]) for r in conn.execute(
+                    f"SELECT id, voter_id FROM voters WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+    return names
+
+
+def fp_duplicate_of(template, exclude=None):
+    """Returns the voter_id already enrolled with a matching fingerprint, or None; exclude is an fp_key()."""
+    if not template:
+        return None
+    matches = get_fp_index().query(template, exclude=exclude, limit=1)
+    if not matches:
+        return None
+    return _fp_voter_ids([matches[0][0]]).get(matches[0][0])
 
 
-# App and DB config
-APP = Flask(__name__)
-APP.secret_key = os.environ.get("SVM_SECRET_KEY", "svm_demo_secret_key_change_me")
-BASE = Path(__file__).resolve().parent
-DB_PATH = BASE / "svm_admin.db"
+def find_fp_duplicates(threshold=None):
+    """Runs the batch duplicate scan over all shards; returns [{"voter_ids": [a, b], "score": s}]."""
+    pairs = get_fp_index().find_duplicates(threshold)
+    names = _fp_voter_ids({i for a, b, _ in pairs for i in (a, b)})
+    return [{"voter_ids": [names.get(a), names.get(b)], "score": sc} for a, b, sc in pairs]
 
 
-# Admin credentials
-ADMIN_USER = "poomalai005"
-ADMIN_PASS = "Poomalai2005@"
-VOTED_STATUS_PASSWORD = "989464"
+@atexit.register
+def save_fp_index():
+    """Persists the fingerprint index so the next start can skip the rebuild."""
+    if FP_INDEX.generation is None:
+        return
+    try:
+        FP_INDEX.save(fp_index_path())
+    except OSError as e:
+        logging.warning(f"Could not save fingerprint index: {e}")
 
 
-# Set up basic logging
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+# Bulk voter import
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_FIELDS = ("voter_id", "name", "dob", "phone", "fingerprint")
+_SQL_IN_CHUNK = 900  # stays under SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
 
 
-# Ensure DB
-def get_conn():
-    """Returns a new database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+def iter_voter_records(stream, fmt):
+    """Yields (line_no, record) from a text stream of CSV (with a header row) or NDJSON, one row at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"unsupported import format: {fmt}")
 
 
-def init_db():
-    """Initializes the SQLite database tables if they don't exist."""
-    created = not DB_PATH.exists()
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS voters (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            voter_id TEXT UNIQUE,
-            name TEXT,
-            dob TEXT,
-            phone TEXT,
-            fingerprint TEXT,
-            has_voted INTEGER DEFAULT 0,
-            created_at TEXT
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS votes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            voter_id TEXT,
-            candidate TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-    return created
+def _validate_import_record(record):
+    """Returns (row tuple, None) for a valid record or (None, error code)."""
+    if record is None:
+        return None, "malformed_row"
+    values = {f: str(record.get(f) or "").strip() for f in IMPORT_FIELDS[:4]}
+    if not values["voter_id"] or not values["name"] or not values["dob"]:
+        return None, "missing_data"
+    if parse_dob(values["dob"]) is None:
+        return None, "invalid_dob"
+    values["dob"] = canonical_dob(values["dob"])
+    try:
+        template = fp_template_blob(record.get("fingerprint"))
+    except ValueError:
+        return None, "invalid_fingerprint"
+    return tuple(values[f] for f in IMPORT_FIELDS[:4]) + (template,), None
 
 
-init_db()
+def _insert_import_batch(conn, batch, created_at):
+    """Inserts one batch inside run_in_transaction(); returns (inserted, [(line_no, voter_id)] duplicates)."""
+    ids = [row[0] for _, row in batch]
+    existing = set()
+    for i in range(0, len(ids), _SQL_IN_CHUNK):
+        chunk = ids[i:i + _SQL_IN_CHUNK]
+        existing.update(r[0] for r in conn.execute(
+            f"SELECT voter_id FROM voters WHERE voter_id IN ({','.join('?' * len(chunk))})", chunk))
+    rows, duplicates = [], []
+    for line_no, row in batch:
+        if row[0] in existing:
+            duplicates.append((line_no, row[0]))
+        else:
+            existing.add(row[0])  # also catches repeats within the file
+            rows.append(row + (created_at,))
+    conn.executemany(
+        "INSERT INTO voters (voter_id, name, dob, phone, fp_template, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    if any(row[4] for row in rows):
+        # Imports are not checked 1:N row by row; the index is rebuilt on next use
+        # and /admin/fingerprints/duplicates reports any duplicates they brought in.
+        bump_fp_generation(conn)
+    return len(rows), duplicates
 
 
-# Utility functions
-def calculate_age(dob_str):
-    """Calculates age in years from a YYYY-MM-DD date string."""
-    try:
-        dob = datetime.strptime(dob_str, "%Y-%m-%d").date()
-    except Exception:
-        return -1
-    today = datetime.utcnow().date()
-    age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-    return age
+def import_voters(records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports (line_no, record) pairs in executemany batches, one transaction per
+    batch and shard so voting is never locked out for long. Invalid rows and duplicate
+    voter_ids are skipped and reported per row (the first IMPORT_MAX_REPORTED_ERRORS).
+    """
+    report = {"imported": 0, "failed": 0, "errors": []}
 
+    def fail(line_no, voter_id, error):
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_no, "voter_id": voter_id, "error": error})
 
-def send_sms(to_number, message):
+    def flush(batch):
+        by_shard = {}
+        for item in batch:
+            by_shard.setdefault(shard_for(item[1][0]), []).append(item)
+        created_at = datetime.utcnow().isoformat()
+        for shard, items in by_shard.items():
+            with db_conn(shard) as conn:
+                inserted, duplicates = run_in_transaction(conn, _insert_import_batch, items, created_at)
+            report["imported"] += inserted
+            for line_no, voter_id in duplicates:
+                fail(line_no, voter_id, "duplicate_voter_id")
+
+    batch = []
+    for line_no, record in records:
+        row, error = _validate_import_record(record)
+        if error:
+            fail(line_no, (record or {}).get("voter_id"), error)
+            continue
+        batch.append((line_no, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    report["errors"].sort(key=lambda e: e["line"])
+    return report
+
+
+# Streaming export
+EXPORT_FETCH_SIZE = 1000
+# table -> (exported columns, table or view read, time column used by the from/to filters,
+#           parser for the from/to values)
+EXPORT_TABLES = {
+    "voters": (("id", "voter_id", "name", "dob", "phone", "has_voted", "created_at"), "voters", "created_at", utc_iso),
+    "votes": (("id", "voter_id", "candidate", "timestamp"), "vote_ledger", "cast_at", epoch_from_iso),
+}
+EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_query(table, filters):
     """
-    Simulates sending an SMS notification.
-    In a real-world scenario, this would use a service like Twilio or Vonage.
-    For this demo, we'll log the message to the console.
+    Builds the SELECT for an export; filters may hold from/to (ISO time) and, for
+    voters, has_voted. Raises ValueError for a from/to value that is not a timestamp.
     """
-    logging.info(f"Simulating SMS to {to_number}: {message}")
+    columns, source, time_column, parse_time = EXPORT_TABLES[table]
+    clauses, params = [], []
+    if filters.get("from"):
+        clauses.append(f"{time_column} >= ?")
+        params.append(parse_time(filters["from"]))
+    if filters.get("to"):
+        clauses.append(f"{time_column} < ?")
+        params.append(parse_time(filters["to"]))
+    if table == "voters" and filters.get("has_voted") in ("0", "1"):
+        clauses.append("has_voted = ?")
+        params.append(int(filters["has_voted"]))
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return f"SELECT {', '.join(columns)} FROM {source}{where} ORDER BY id", params
+
+
+def iter_export(table, fmt, filters, fetch_size=EXPORT_FETCH_SIZE):
+    """
+    Yields an export as text chunks, fetching fetch_size rows at a time from one
+    cursor per shard so memory use does not depend on the table size. Shards are
+    exported one after another; with more than one, rows carry a "shard" column
+    because ids are only unique within a shard.
+    """
+    sharded = NUM_SHARDS > 1
+    columns = EXPORT_TABLES[table][0] + (("shard",) if sharded else ())
+    sql, params = export_query(table, filters)
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    row = tuple(row) + (shard,) if sharded else row
+                    if writer:
+                        writer.writerow(row)
+                    else:
+                        buf.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def import_format_for(filename, requested=None):
+    """Picks the import format from an explicit choice or the file extension."""
+    if requested in ("csv", "ndjson"):
+        return requested
+    return "ndjson" if str(filename or "").lower().endswith((".ndjson", ".jsonl", ".json")) else "csv"
 
 
 # --------------------
-# Admin pages (using render_template_string)
+# Admin pages (compiled once from the TEMPLATES registry below)
 # --------------------
 ADMIN_LOGIN_HTML = """
 <!doctype html>
@@ -154,7 +2113,7 @@ input{padding: 10px; border-radius: 5px; border: 1px solid #555; background-colo
 button{padding: 10px; background-color: #28a745; color: white; border: none; cursor: pointer;}
 </style>
 <h2>Admin — Add Voter</h2>
-<p><a href="{{ url_for('admin_list') }}">List voters</a> | <a href="{{ url_for('admin_logout') }}">Logout</a></p>
+<p><a href="{{ url_for('admin_list') }}">List voters</a> | <a href="{{ url_for('admin_import') }}">Bulk import</a> | <a href="{{ url_for('admin_logout') }}">Logout</a></p>
 {% with messages = get_flashed_messages(with_categories=true) %}
   {% if messages %}
     <ul>
@@ -169,13 +2128,56 @@ button{padding: 10px; background-color: #28a745; color: white; border: none; cur
   <label>Name: <input name="name" required></label>
   <label>DOB (YYYY-MM-DD): <input name="dob" required></label>
   <label>Phone: <input name="phone"></label>
-  <label>Fingerprint template (text placeholder): <input name="fingerprint"></label>
+  <label>Fingerprint template ({{ fp_dim }} comma-separated values, base64, or a text placeholder): <input name="fingerprint"></label>
   <br>
   <button type="submit">Add Voter</button>
 </form>
 """
 
 
+ADMIN_IMPORT_HTML = """
+<!doctype html>
+<title>Import Voters</title>
+<style>
+body{font-family: Arial; max-width: 700px; margin: 20px auto; padding: 15px; background-color: #000; color: #fff; border-radius: 8px; box-shadow: 0 4px 8px rgba(255,255,255,0.1);}
+h2{color: #fff; text-align: center;}
+p a{color: #3498db;}
+form{display: flex; flex-direction: column; gap: 10px;}
+label{font-weight: bold;}
+input, select{padding: 10px; border-radius: 5px; border: 1px solid #555; background-color: #333; color: #fff;}
+button{padding: 10px; background-color: #28a745; color: white; border: none; cursor: pointer;}
+table{width: 100%; border-collapse: collapse; margin-top: 15px;}
+th, td{border: 1px solid #555; padding: 6px; text-align: left;}
+</style>
+<h2>Admin — Import Voters</h2>
+<p><a href="{{ url_for('admin_list') }}">List voters</a> | <a href="{{ url_for('admin_add') }}">Add voter</a> | <a href="{{ url_for('admin_logout') }}">Logout</a></p>
+<p>CSV with a header row, or NDJSON (one JSON object per line), with fields: voter_id, name, dob (YYYY-MM-DD), phone, fingerprint.</p>
+<form method="post" enctype="multipart/form-data">
+  <label>File: <input type="file" name="file" required></label>
+  <label>Format:
+    <select name="format">
+      <option value="">Detect from file name</option>
+      <option value="csv">CSV</option>
+      <option value="ndjson">NDJSON</option>
+    </select>
+  </label>
+  <button type="submit">Import</button>
+</form>
+{% if report %}
+  <h3>Imported {{ report.imported }} voter(s), {{ report.failed }} row(s) rejected.</h3>
+  {% if report.errors %}
+  <table>
+  <tr><th>Line</th><th>Voter QR ID</th><th>Error</th></tr>
+  {% for e in report.errors %}
+    <tr><td>{{ e.line }}</td><td>{{ e.voter_id }}</td><td>{{ e.error }}</td></tr>
+  {% endfor %}
+  </table>
+  {% if report.failed > report.errors|length %}<p>Only the first {{ report.errors|length }} errors are shown.</p>{% endif %}
+  {% endif %}
+{% endif %}
+"""
+
+
 ADMIN_EDIT_HTML = """
 <!doctype html>
 <title>Edit Voter</title>
@@ -204,7 +2206,7 @@ button{padding: 10px; background-color: #28a745; color: white; border: none; cur
   <label>Name: <input name="name" value="{{ voter.name }}" required></label>
   <label>DOB (YYYY-MM-DD): <input name="dob" value="{{ voter.dob }}" required></label>
   <label>Phone: <input name="phone" value="{{ voter.phone }}"></label>
-  <label>Fingerprint template (text placeholder): <input name="fingerprint" value="{{ voter.fingerprint }}"></label>
+  <label>Fingerprint template ({{ 'enrolled' if voter.fp_template else 'not enrolled' }}; leave blank to keep): <input name="fingerprint" value=""></label>
   <br>
   <button type="submit">Update Voter</button>
 </form>
@@ -226,9 +2228,34 @@ button.edit { background-color: #3498db; }
 button.delete { background-color: #dc3545; margin-left: 5px; }
 button.toggle { background-color: #555; margin-left: 5px; }
 .toggle-form { display: inline-flex; align-items: center; gap: 5px; }
+.filters { display: flex; gap: 8px; }
+.filters input, .filters select { padding: 5px; border-radius: 4px; border: 1px solid #555; background-color: #333; color: #fff; }
 </style>
 <h2>Registered Voters</h2>
-<p><a href="{{ url_for('admin_add') }}">Add voter</a> | <a href="{{ url_for('admin_logout') }}">Logout</a></p>
+<p><a href="{{ url_for('admin_add') }}">Add voter</a> | <a href="{{ url_for('admin_import') }}">Bulk import</a> | <a href="{{ url_for('admin_dashboard') }}">Live dashboard</a> | <a href="{{ url_for('admin_logout') }}">Logout</a></p>
+<p>Export: <a href="{{ url_for('admin_export', table='voters', fmt='csv', **link_filters) }}">voters CSV</a>
+ | <a href="{{ url_for('admin_export', table='voters', fmt='ndjson', **link_filters) }}">voters NDJSON</a>
+ | <a href="{{ url_for('admin_export', table='votes', fmt='csv') }}">votes CSV</a>
+ | <a href="{{ url_for('admin_export', table='votes', fmt='ndjson') }}">votes NDJSON</a></p>
+<form method="get" class="filters">
+  <input name="search" value="{{ search }}" placeholder="Search name, QR ID or phone" size="30">
+  <button class="edit" type="submit">Search</button>
+  {% if search %}<a href="{{ url_for('admin_list') }}">Show all</a>{% endif %}
+</form>
+<form method="get" class="filters">
+  <input name="q" value="{{ filters.q }}" placeholder="Voter QR ID prefix">
+  <input name="name" value="{{ filters.name }}" placeholder="Name prefix">
+  <select name="has_voted">
+    <option value="" {{ 'selected' if filters.has_voted == '' }}>All</option>
+    <option value="1" {{ 'selected' if filters.has_voted == '1' }}>Voted</option>
+    <option value="0" {{ 'selected' if filters.has_voted == '0' }}>Not voted</option>
+  </select>
+  <button class="edit" type="submit">Filter</button>
+</form>
+<p>{% if total is not none %}{{ total }} {{ 'best match(es)' if search else 'matching voter(s)' }}.{% endif %}
+{% if prev_before %}<a href="{{ url_for('admin_list', before=prev_before, **link_filters) }}">&laquo; Previous</a>{% endif %}
+{% if next_after %}<a href="{{ url_for('admin_list', after=next_after, **link_filters) }}">Next &raquo;</a>{% endif %}
+</p>
 <table border="1" cellpadding="6">
 <tr><th>ID</th><th>Voter QR ID</th><th>Name</th><th>DOB</th><th>Phone</th><th>Has Voted</th><th>Actions</th></tr>
 {% for v in voters %}
@@ -255,6 +2282,63 @@ button.toggle { background-color: #555; margin-left: 5px; }
 """
 
 
+ADMIN_DASHBOARD_HTML = """
+<!doctype html>
+<title>Live dashboard</title>
+<style>
+body{font-family: Arial; max-width: 900px; margin: 20px auto; padding: 15px; background-color: #000; color: #fff; border-radius: 8px; box-shadow: 0 4px 8px rgba(255,255,255,0.1);}
+h2{color: #fff; text-align: center;}
+p a{color: #3498db;}
+table{width: 100%; border-collapse: collapse; margin-top: 15px;}
+th, td{border: 1px solid #555; padding: 8px; text-align: left;}
+th{background-color: #333;}
+.stat{font-size: 1.4em; margin-right: 30px;}
+#conn.down{color: #dc3545;}
+</style>
+<h2>Live Turnout and Tallies</h2>
+<p><a href="{{ url_for('admin_list') }}">Voters</a> | <a href="{{ url_for('admin_logout') }}">Logout</a> | <span id="conn">connecting...</span></p>
+<p><span class="stat">Votes: <b id="total">0</b></span><span class="stat">Turnout: <b id="turnout">0</b>%</span>
+<span class="stat">Eligible: <b id="eligible">0</b></span></p>
+<table><thead><tr><th>Candidate</th><th>Votes</th></tr></thead><tbody id="tallies"></tbody></table>
+<h3>Recent verification failures</h3>
+<table><thead><tr><th>Time (UTC)</th><th>Stage</th><th>Result</th></tr></thead><tbody id="failures"></tbody></table>
+<script>
+let state = {tallies: {}, total: 0, eligible: 0};
+function render() {
+    document.getElementById('total').textContent = state.total;
+    document.getElementById('eligible').textContent = state.eligible;
+    document.getElementById('turnout').textContent = state.eligible ? (100 * state.total / state.eligible).toFixed(2) : '0.00';
+    const body = document.getElementById('tallies');
+    body.innerHTML = '';
+    Object.keys(state.tallies).sort().forEach(name => {
+        const row = body.insertRow();
+        row.insertCell().textContent = name;
+        row.insertCell().textContent = state.tallies[name];
+    });
+}
+const events = new EventSource("{{ url_for('admin_events') }}");
+events.onopen = () => { const c = document.getElementById('conn'); c.textContent = 'live'; c.className = ''; };
+events.onerror = () => { const c = document.getElementById('conn'); c.textContent = 'reconnecting...'; c.className = 'down'; };
+events.addEventListener('snapshot', e => { state = JSON.parse(e.data); render(); });
+events.addEventListener('vote', e => {
+    const votes = JSON.parse(e.data).votes;
+    for (const name in votes) {
+        state.tallies[name] = (state.tallies[name] || 0) + votes[name];
+        state.total += votes[name];
+    }
+    render();
+});
+events.addEventListener('verification_failed', e => {
+    const f = JSON.parse(e.data);
+    const body = document.getElementById('failures');
+    const row = body.insertRow(0);
+    [f.at, f.stage, f.result].forEach(v => { row.insertCell().textContent = v; });
+    while (body.rows.length > 20) { body.deleteRow(-1); }
+});
+</script>
+"""
+
+
 # --------------------
 # Voting UI & API
 # --------------------
@@ -266,7 +2350,12 @@ INDEX_HTML = """
   <meta name="viewport" content="width=device-width,initial-scale=1"/>
   <title>Smart Voting</title>
   <style>
+    {% if assets.fonts_local %}
+    @font-face { font-family: 'Roboto'; font-weight: 400; font-display: swap; src: url('{{ assets.roboto_400 }}') format('woff2'); }
+    @font-face { font-family: 'Roboto'; font-weight: 700; font-display: swap; src: url('{{ assets.roboto_700 }}') format('woff2'); }
+    {% else %}
     @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@400;700&display=swap');
+    {% endif %}
     
     body {
         font-family: 'Roboto', sans-serif;
@@ -493,10 +2582,11 @@ INDEX_HTML = """
   </div>
 
 
-<script src="https://unpkg.com/html5-qrcode"></script>
+<script src="{{ assets.qr_js }}"></script>
 <script>
 // Basic flow variables
 let currentVoter = null;
+let currentTicket = null;  // signed proof of the verification steps passed so far
 let html5QrcodeScanner = null;
 
 
@@ -555,6 +2645,7 @@ function onScanFailure(error) {
 
 // Initialize QR code scanner
 function startQrScanner() {
+    if (typeof Html5QrcodeScanner === 'undefined') { return; }
     html5QrcodeScanner = new Html5QrcodeScanner("reader", {
         fps: 10,
         qrbox: { width: 250, height: 250 }
@@ -563,87 +2654,590 @@ function startQrScanner() {
 }
 
 
-window.addEventListener('load', startQrScanner);
+window.addEventListener('load', startQrScanner);
+
+
+// Return the kiosk to step 1 for the next voter without reloading the page
+function resetKiosk(delayMs = 3000) {
+    setTimeout(() => {
+        currentVoter = null;
+        currentTicket = null;
+        ['details', 'fp', 'voting'].forEach(id => { document.getElementById(id).style.display = 'none'; });
+        document.getElementById('step1').style.display = 'block';
+        ['qr-status', 'fp-status', 'vote-status'].forEach(id => {
+            const el = document.getElementById(id);
+            el.textContent = '';
+            el.className = 'status-message';
+        });
+        document.getElementById('qr-input').value = '';
+        document.getElementById('fp-input').value = '';
+        document.getElementById('voter-info').innerHTML = '';
+        let cleared = Promise.resolve();
+        if (html5QrcodeScanner) {
+            try { cleared = Promise.resolve(html5QrcodeScanner.clear()); } catch (e) { /* already stopped */ }
+        }
+        cleared.catch(() => {}).then(startQrScanner);
+    }, delayMs);
+}
+
+
+// Server shedding load (429/503): wait at least as long as its Retry-After asks
+function retryDelayMs(res) {
+    return Math.max(3000, 1000 * (parseInt(res.headers.get('Retry-After'), 10) || 0));
+}
+
+
+async function verifyQrCode(qr) {
+    if (!qr) { setStatus('qr-status', 'Error: Enter a QR ID.', 'error'); return; }
+    const res = await fetch('/api/verify_qr', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: qr})});
+    const j = await res.json();
+    if (j.ok) {
+        currentVoter = j.voter;
+        currentTicket = j.ticket;
+        setStatus('qr-status', `QR OK. Welcome, ${currentVoter.name}.`, 'success');
+        document.getElementById('voter-info').innerHTML = `<strong>Name:</strong> ${currentVoter.name}<br><strong>DOB:</strong> ${currentVoter.dob}<br><strong>Phone:</strong> ${currentVoter.phone}`;
+        document.getElementById('details').style.display = 'block';
+        document.getElementById('step1').style.display = 'none';
+    } else {
+        setStatus('qr-status', 'Error: ' + (j.detail || j.error || 'unknown error'), 'error');
+        // Auto-reset on error
+        resetKiosk(retryDelayMs(res));
+    }
+}
+
+
+// Verify QR ID by server for manual input
+document.getElementById('verify-qr-btn').onclick = () => {
+    const qr = document.getElementById('qr-input').value.trim();
+    if (html5QrcodeScanner) {
+        html5QrcodeScanner.clear();
+    }
+    verifyQrCode(qr);
+}
+
+
+// Fingerprint stage (simulated string match)
+document.getElementById('start-fp-btn').onclick = () => {
+    document.getElementById('fp').style.display = 'block';
+    document.getElementById('details').style.display = 'none';
+}
+
+
+document.getElementById('verify-fp-btn').onclick = async () => {
+    const payload = document.getElementById('fp-input').value.trim();
+    if (!payload) { setStatus('fp-status', 'Error: Enter fingerprint payload.', 'error'); return; }
+    const res = await fetch('/api/verify_fingerprint', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: currentVoter.voter_id, fp_payload: payload, ticket: currentTicket})});
+    const j = await res.json();
+    if (j.ok) {
+        currentTicket = j.ticket;
+        setStatus('fp-status', 'Fingerprint OK!', 'success');
+        document.getElementById('voting').style.display = 'block';
+        document.getElementById('fp').style.display = 'none';
+    } else {
+        setStatus('fp-status', 'Fingerprint verification failed.', 'error');
+        resetKiosk(retryDelayMs(res));
+    }
+}
+
+
+// Voting
+Array.from(document.getElementsByClassName('candidate')).forEach(btn => {
+    btn.onclick = () => {
+        showConfirmModal(`Confirm vote for ${btn.dataset.name}?`, async () => {
+            const res = await fetch('/api/cast_vote', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: currentVoter.voter_id, candidate: btn.dataset.name, ticket: currentTicket})});
+            const j = await res.json();
+            if (j.ok) {
+                setStatus('vote-status', `Vote for ${btn.dataset.name} has been cast!`, 'success');
+                resetKiosk(); // Ready for the next voter after 3s
+            } else if (res.status === 429 || res.status === 503) {
+                // Not recorded and the ticket is still valid: let the voter confirm again
+                setStatus('vote-status', `Server busy, please confirm again in ${j.retry_after || 1}s.`, 'error');
+            } else {
+                setStatus('vote-status', 'Error: ' + (j.error || j.detail || 'unknown'), 'error');
+                // Auto-reset on error
+                resetKiosk();
+            }
+        });
+    }
+});
+</script>
+</body>
+</html>
+"""
+
+
+TEMPLATES = {
+    "admin_login.html": ADMIN_LOGIN_HTML,
+    "admin_add.html": ADMIN_ADD_HTML,
+    "admin_import.html": ADMIN_IMPORT_HTML,
+    "admin_edit.html": ADMIN_EDIT_HTML,
+    "admin_list.html": ADMIN_LIST_HTML,
+    "admin_dashboard.html": ADMIN_DASHBOARD_HTML,
+    "index.html": INDEX_HTML,
+}
+APP.jinja_loader = DictLoader(TEMPLATES)
+
+
+def warm_templates():
+    """Compiles every template up front; Jinja keeps the compiled code cached on APP.jinja_env."""
+    for name in TEMPLATES:
+        APP.jinja_env.get_template(name)
+
+
+# Self-hosted front-end assets
+# `python smart_voting_system.py fetch-assets` downloads these once into static/;
+# until then the page falls back to the CDN copies.
+STATIC_DIR = BASE / "static"
+ASSET_MAX_AGE = 365 * 24 * 3600
+INDEX_MAX_AGE = 300
+VENDOR_ASSETS = {
+    "qr_js": ("vendor/html5-qrcode.min.js",
+              "https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js"),
+    "roboto_400": ("vendor/roboto-latin-400-normal.woff2",
+                   "https://unpkg.com/@fontsource/roboto@5.0.8/files/roboto-latin-400-normal.woff2"),
+    "roboto_700": ("vendor/roboto-latin-700-normal.woff2",
+                   "https://unpkg.com/@fontsource/roboto@5.0.8/files/roboto-latin-700-normal.woff2"),
+}
+
+
+def asset_urls():
+    """Returns {name: url}, using content-versioned local URLs for assets present in static/."""
+    urls, local = {}, set()
+    for name, (rel, cdn) in VENDOR_ASSETS.items():
+        path = STATIC_DIR / rel
+        if path.is_file():
+            urls[name] = url_for("asset", filename=rel, v=hashlib.sha256(path.read_bytes()).hexdigest()[:12])
+            local.add(name)
+        else:
+            urls[name] = cdn
+    urls["fonts_local"] = {"roboto_400", "roboto_700"} <= local
+    return urls
+
+
+_INDEX_PAGE = None  # (etag, html bytes, gzipped html bytes), rendered once per process
+
+
+def _index_page():
+    """Pre-renders the static voting page shell on first use."""
+    global _INDEX_PAGE
+    if _INDEX_PAGE is None:
+        html = render_template("index.html", assets=asset_urls()).encode("utf-8")
+        _INDEX_PAGE = (hashlib.sha256(html).hexdigest()[:20], html, gzip.compress(html, 9))
+    return _INDEX_PAGE
+
+
+@APP.route("/")
+def index():
+    """Serves the pre-rendered voting machine UI, gzipped and revalidated by ETag."""
+    etag, html, html_gz = _index_page()
+    use_gzip = "gzip" in request.accept_encodings
+    resp = Response(html_gz if use_gzip else html, mimetype="text/html")
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.set_etag(etag + ("-gz" if use_gzip else ""))
+    resp.cache_control.public = True
+    resp.cache_control.max_age = INDEX_MAX_AGE
+    return resp.make_conditional(request)
+
+
+@APP.route("/assets/<path:filename>")
+def asset(filename):
+    """Serves self-hosted vendor assets; their URLs are content-versioned, so they cache for a year."""
+    resp = send_from_directory(STATIC_DIR, filename, max_age=ASSET_MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+# Voter read-through cache
+# The three verification steps read the same voter within seconds of each other;
+# serve the repeats from memory. Writers invalidate explicitly, and the TTL
+# bounds staleness for changes made by other processes. The conditional write
+# in record_vote() stays the authority on has_voted.
+VOTER_CACHE_SIZE = int(os.environ.get("SVM_VOTER_CACHE_SIZE", "10000"))
+VOTER_CACHE_TTL_S = float(os.environ.get("SVM_VOTER_CACHE_TTL", "30"))
+VOTER_CACHE_COLUMNS = "id, voter_id, name, dob, dob_int, phone, fp_template, has_voted"
+
+
+class VoterCache:
+    """Bounded LRU cache of voter records with a TTL, keyed by voter_id."""
+
+    def __init__(self, maxsize=VOTER_CACHE_SIZE, ttl=VOTER_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loading = {}  # voter_id -> token of the load in flight; invalidate() cancels it
+        self._lock = threading.Lock()
+
+    def get(self, voter_id, loader):
+        """
+        Returns the cached record, or calls loader() and caches its result
+        unless it is None or the voter was invalidated while it loaded.
+        """
+        now = time.monotonic()
+        token = object()
+        with self._lock:
+            entry = self._entries.get(voter_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(voter_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self._loading[voter_id] = token
+        try:
+            record = loader()
+        except BaseException:
+            with self._lock:
+                if self._loading.get(voter_id) is token:
+                    del self._loading[voter_id]
+            raise
+        with self._lock:
+            if self._loading.get(voter_id) is token:
+                del self._loading[voter_id]
+                if record is not None:
+                    self._entries[voter_id] = (now + self.ttl, record)
+                    self._entries.move_to_end(voter_id)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, voter_id):
+        """Drops one voter from the cache, and any load of it already in flight."""
+        with self._lock:
+            self._entries.pop(voter_id, None)
+            self._loading.pop(voter_id, None)
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._loading.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+VOTER_CACHE = VoterCache()
+
+
+def get_voter(conn, voter_id):
+    """Returns the voter record as a dict (read through VOTER_CACHE), or None if not registered."""
+    def load():
+        r = conn.execute(f"SELECT {VOTER_CACHE_COLUMNS} FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
+        return dict(r) if r else None
+    return VOTER_CACHE.get(voter_id, load)
+
+
+# Verification tickets
+# Each passed step returns a short-lived ticket, HMAC-signed with a key derived
+# from APP.secret_key, that names the voter row and the stages passed so far.
+# The next step trusts the ticket instead of looking the voter up again, and
+# cast_vote refuses to run unless both QR and fingerprint stages are present.
+TICKET_TTL_S = int(os.environ.get("SVM_TICKET_TTL", "300"))
+STAGES_FOR_VOTE = ("qr", "fp")
+
+
+def _ticket_key():
+    return hashlib.sha256(b"svm-verification-ticket:" + str(APP.secret_key).encode("utf-8")).digest()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def issue_ticket(row_id, voter_id, stages, eligible=True):
+    """Returns a signed ticket for a voter row that has passed `stages`."""
+    payload = _b64(json.dumps({"r": row_id, "v": voter_id, "e": int(eligible), "s": sorted(stages),
+                               "x": int(time.time()) + TICKET_TTL_S}, separators=(",", ":")).encode("utf-8"))
+    sig = _b64(hmac.new(_ticket_key(), payload.encode("ascii"), hashlib.sha256).digest())
+    return f"{payload}.{sig}"
+
+
+def read_ticket(token, voter_id=None, stages=()):
+    """
+    Returns the ticket payload if the signature is valid, it has not expired, the
+    voter is eligible, it carries every stage in `stages` and (if given) it names
+    voter_id; otherwise None.
+    """
+    try:
+        payload, sig = str(token or "").split(".", 1)
+        expected = _b64(hmac.new(_ticket_key(), payload.encode("ascii"), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        data = json.loads(_unb64(payload))
+    except (ValueError, binascii.Error):
+        return None
+    if data.get("x", 0) < time.time() or not data.get("e"):
+        return None
+    if voter_id and data.get("v") != voter_id:
+        return None
+    if not set(stages) <= set(data.get("s", ())):
+        return None
+    return data
+
+
+def record_vote(conn, voter_id, candidate, cast_at, row_id=None):
+    """
+    Records a vote; must run inside run_in_transaction().
+    The conditional UPDATE is the only has_voted check, so two kiosks racing on
+    the same voter cannot both succeed: the loser gets no row back. When the
+    caller already knows the voters.id (from a ticket) it is matched by primary key.
+    cast_at is in epoch seconds.
+    Returns (outcome, phone) where outcome is "recorded", "already_voted" or "voter_not_found".
+    """
+    key_sql, key = ("id=?", row_id) if row_id is not None else ("voter_id=?", voter_id)
+    updated = conn.execute(f"UPDATE voters SET has_voted=1 WHERE {key_sql} AND has_voted=0 RETURNING phone",
+                           (key,)).fetchall()  # fetchall() runs the statement to completion
+    if not updated:
+        exists = conn.execute(f"SELECT 1 FROM voters WHERE {key_sql}", (key,)).fetchone()
+        return ("already_voted" if exists else "voter_not_found"), None
+    cid = candidate_id(conn, candidate)
+    conn.execute("INSERT INTO votes (voter_id, candidate_id, cast_at) VALUES (?,?,?)", (voter_id, cid, cast_at))
+    conn.execute("INSERT INTO tallies (candidate_id, votes) VALUES (?, 1) "
+                 "ON CONFLICT(candidate_id) DO UPDATE SET votes = votes + 1", (cid,))
+    phone = updated[0]["phone"]
+    if phone:
+        enqueue_sms(conn, phone, f"Your vote has been successfully cast for {candidate}.")
+    return "recorded", phone
+
+
+# --------------------
+# Admission control
+# --------------------
+# Every /api/* request spends a token from its client's bucket (keyed by
+# remote address); a looping kiosk gets fast 429s instead of queueing behind
+# well-behaved booths. Vote writes also need one of WRITE_CONCURRENCY slots so
+# bursts wait briefly and then get a 503, rather than piling up on the SQLite
+# writer lock. Both limits are per worker process.
+API_RATE_PER_S = float(os.environ.get("SVM_API_RATE", "5"))
+API_BURST = int(os.environ.get("SVM_API_BURST", "20"))
+API_LIMITER_MAX_CLIENTS = 10000
+WRITE_CONCURRENCY = int(os.environ.get("SVM_WRITE_CONCURRENCY", "4"))
+WRITE_QUEUE_TIMEOUT_S = 0.25
+OVERLOAD_RETRY_AFTER_S = 1
+
+
+class ClientBuckets:
+    """A TokenBucket per client, LRU-bounded so a spray of addresses cannot grow it forever."""
+
+    def __init__(self, rate=API_RATE_PER_S, burst=API_BURST, max_clients=API_LIMITER_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        """Takes one token; returns 0 if admitted, else the seconds until a token is available."""
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        return bucket.try_acquire()
+
+
+API_LIMITER = ClientBuckets()
+WRITE_SLOTS = threading.BoundedSemaphore(WRITE_CONCURRENCY)
+
+
+def _reject(reason, status, retry_after):
+    """A fast JSON rejection carrying Retry-After (whole seconds, at least 1)."""
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    METRICS.inc("svm_rejected_requests_total", reason=reason, route=route)
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify(ok=False, error=reason, retry_after=retry_after)
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+@APP.before_request
+def limit_api_rate():
+    """Sheds /api/* requests from clients over their rate with 429."""
+    if API_RATE_PER_S > 0 and request.path.startswith("/api/"):
+        wait = API_LIMITER.acquire(request.remote_addr)
+        if wait:
+            return _reject("rate_limited", 429, wait)
+
+
+def admit_write(view):
+    """Runs the view only with a free write slot, answering 503 if none frees up within WRITE_QUEUE_TIMEOUT_S."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not WRITE_SLOTS.acquire(timeout=WRITE_QUEUE_TIMEOUT_S):
+            return _reject("overloaded", 503, OVERLOAD_RETRY_AFTER_S)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            WRITE_SLOTS.release()
+    return wrapper
+
+
+# --------------------
+# Live dashboard events
+# --------------------
+# The vote and verification endpoints publish small events to an in-process
+# bus; each /admin/events subscriber gets them as server-sent events. Events
+# are serialized once and shared by every subscriber. One ticker thread per
+# process publishes a tallies/turnout snapshot every SSE_SNAPSHOT_S while
+# anyone is subscribed, which also folds in votes taken by other workers.
+SSE_QUEUE_SIZE = 256              # events buffered per subscriber before it is resynced with a snapshot
+SSE_MAX_SUBSCRIBERS = int(os.environ.get("SVM_SSE_MAX_SUBSCRIBERS", "50"))
+SSE_KEEPALIVE_S = 15.0
+SSE_SNAPSHOT_S = 5.0
+SSE_ELIGIBLE_TTL_S = 60.0         # eligibility_stats() counts the roll, so its figure is reused for a while
+SSE_RETRY_MS = 3000
+
+
+def sse_message(event, data):
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """One dashboard connection's bounded queue of pre-formatted events."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.lagged = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.lagged = True
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class EventBus:
+    """In-process publish/subscribe for the live dashboard."""
+
+    CLOSED = object()
 
+    def __init__(self, max_subscribers=SSE_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ticker = None
+        self._wake = threading.Event()
+        self._snapshot = (0.0, None)
+        self._eligible = (0.0, 0)
 
-async function verifyQrCode(qr) {
-    if (!qr) { setStatus('qr-status', 'Error: Enter a QR ID.', 'error'); return; }
-    const res = await fetch('/api/verify_qr', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: qr})});
-    const j = await res.json();
-    if (j.ok) {
-        currentVoter = j.voter;
-        setStatus('qr-status', `QR OK. Welcome, ${currentVoter.name}.`, 'success');
-        document.getElementById('voter-info').innerHTML = `<strong>Name:</strong> ${currentVoter.name}<br><strong>DOB:</strong> ${currentVoter.dob}<br><strong>Phone:</strong> ${currentVoter.phone}`;
-        document.getElementById('details').style.display = 'block';
-        document.getElementById('step1').style.display = 'none';
-    } else {
-        setStatus('qr-status', 'Error: ' + (j.detail || 'unknown error'), 'error');
-        // Auto-refresh on error
-        setTimeout(() => { window.location.reload(); }, 3000);
-    }
-}
+    def subscribe(self):
+        """Registers a subscriber; None when the bus is closed or full."""
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            sub = Subscription()
+            self._subscribers.add(sub)
+            if self._ticker is None or not self._ticker.is_alive():
+                self._ticker = threading.Thread(target=self._tick, name="sse-ticker", daemon=True)
+                self._ticker.start()
+        return sub
 
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
 
-// Verify QR ID by server for manual input
-document.getElementById('verify-qr-btn').onclick = () => {
-    const qr = document.getElementById('qr-input').value.trim();
-    if (html5QrcodeScanner) {
-        html5QrcodeScanner.clear();
-    }
-    verifyQrCode(qr);
-}
+    def subscriber_count(self):
+        return len(self._subscribers)
 
+    def publish(self, event, data):
+        """Queues an event for every subscriber; costs nothing when nobody is listening."""
+        if not self._subscribers:
+            return
+        message = sse_message(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(message)
 
-// Fingerprint stage (simulated string match)
-document.getElementById('start-fp-btn').onclick = () => {
-    document.getElementById('fp').style.display = 'block';
-    document.getElementById('details').style.display = 'none';
-}
+    def next_message(self, sub, timeout=SSE_KEEPALIVE_S):
+        """
+        Blocks for the subscriber's next message: an event, a fresh snapshot if
+        it fell behind, None on timeout (send a keep-alive) or CLOSED at shutdown.
+        """
+        try:
+            message = sub.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if message is not self.CLOSED and sub.lagged:
+            sub.lagged = False
+            sub.drain()
+            METRICS.inc("svm_sse_resyncs_total")
+            return sse_message("snapshot", self.snapshot())
+        return message
 
+    def close(self):
+        """Ends every stream so shutdown can join the request threads."""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        self._wake.set()
+        for sub in subscribers:
+            sub.drain()
+            sub.offer(self.CLOSED)
 
-document.getElementById('verify-fp-btn').onclick = async () => {
-    const payload = document.getElementById('fp-input').value.trim();
-    if (!payload) { setStatus('fp-status', 'Error: Enter fingerprint payload.', 'error'); return; }
-    const res = await fetch('/api/verify_fingerprint', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: currentVoter.voter_id, fp_payload: payload})});
-    const j = await res.json();
-    if (j.ok) {
-        setStatus('fp-status', 'Fingerprint OK!', 'success');
-        document.getElementById('voting').style.display = 'block';
-        document.getElementById('fp').style.display = 'none';
-    } else {
-        setStatus('fp-status', 'Fingerprint verification failed.', 'error');
-        setTimeout(() => { window.location.reload(); }, 3000);
-    }
-}
+    def snapshot(self, max_age=SSE_SNAPSHOT_S):
+        """Running tallies and turnout over all shards, recomputed at most every max_age seconds."""
+        now = time.monotonic()
+        taken, snapshot = self._snapshot
+        if snapshot is not None and now - taken < max_age:
+            return snapshot
+        checked, eligible = self._eligible
+        if now - checked >= SSE_ELIGIBLE_TTL_S:
+            eligible = eligibility_stats()["eligible"]
+            self._eligible = (now, eligible)
+        tallies = all_tallies()
+        total = sum(tallies.values())
+        snapshot = {"tallies": tallies, "total": total, "eligible": eligible,
+                    "turnout_pct": round(100.0 * total / eligible, 2) if eligible else 0.0,
+                    "at": iso_from_epoch(int(time.time()))}
+        self._snapshot = (now, snapshot)
+        return snapshot
 
+    def _tick(self):
+        while not self._closed and self._subscribers:
+            self._wake.wait(SSE_SNAPSHOT_S)
+            if self._closed or not self._subscribers:
+                return
+            try:
+                self.publish("snapshot", self.snapshot(max_age=0))
+            except Exception:
+                logging.exception("Dashboard snapshot failed")
 
-// Voting
-Array.from(document.getElementsByClassName('candidate')).forEach(btn => {
-    btn.onclick = () => {
-        showConfirmModal(`Confirm vote for ${btn.dataset.name}?`, async () => {
-            const res = await fetch('/api/cast_vote', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({voter_id: currentVoter.voter_id, candidate: btn.dataset.name})});
-            const j = await res.json();
-            if (j.ok) {
-                setStatus('vote-status', `Vote for ${btn.dataset.name} has been cast!`, 'success');
-                setTimeout(() => { window.location.reload(); }, 3000); // Reload after 3s
-            } else {
-                setStatus('vote-status', 'Error: ' + (j.error || j.detail || 'unknown'), 'error');
-                // Auto-refresh on error
-                setTimeout(() => { window.location.reload(); }, 3000);
-            }
-        });
-    }
-});
-</script>
-</body>
-</html>
-"""
 
+EVENT_BUS = EventBus()
 
-@APP.route("/")
-def index():
-    """Renders the main voting machine UI."""
-    return render_template_string(INDEX_HTML)
+
+def record_verification(stage, result):
+    """Counts a verification attempt and publishes failures to live dashboards."""
+    METRICS.inc("svm_verifications_total", stage=stage, result=result)
+    if result != "ok":
+        EVENT_BUS.publish("verification_failed", {"stage": stage, "result": result,
+                                                  "at": iso_from_epoch(int(time.time()))})
 
 
 # --- API endpoints used by frontend ---
@@ -654,16 +3248,16 @@ def api_verify_qr():
     voter_id = data.get("voter_id", "").strip()
     if not voter_id:
         return jsonify(ok=False, error="missing_voter_id"), 400
-    conn = get_conn()
-    r = conn.execute("SELECT * FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
-    conn.close()
+    r = get_voter(voter_conn(voter_id), voter_id)
     if not r:
+        record_verification("qr", "not_registered")
         return jsonify(ok=False, error="not_registered", detail="Contact Admin or NOT Registered"), 404
-    age = calculate_age(r["dob"])
-    if age < 18:
-        return jsonify(ok=False, error="underage", age=age), 403
+    if r["dob_int"] is None or r["dob_int"] > eligibility_cutoff():
+        record_verification("qr", "underage")
+        return jsonify(ok=False, error="underage", age=age_from_dob_int(r["dob_int"])), 403
+    record_verification("qr", "ok")
     voter = {"voter_id": r["voter_id"], "name": r["name"], "dob": r["dob"], "phone": r["phone"], "has_voted": bool(r["has_voted"])}
-    return jsonify(ok=True, voter=voter)
+    return jsonify(ok=True, voter=voter, ticket=issue_ticket(r["id"], r["voter_id"], ["qr"]))
 
 
 @APP.route("/api/verify_fingerprint", methods=["POST"])
@@ -674,17 +3268,27 @@ def api_verify_fingerprint():
     fp_payload = data.get("fp_payload")
     if not voter_id or fp_payload is None:
         return jsonify(ok=False, error="missing_data"), 400
-    conn = get_conn()
-    r = conn.execute("SELECT fingerprint FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
-    conn.close()
+    ticket = read_ticket(data.get("ticket"), voter_id, stages=("qr",))
+    if ticket is None:
+        record_verification("fingerprint", "verification_required")
+        return jsonify(ok=False, error="verification_required"), 403
+    r = get_voter(voter_conn(voter_id), voter_id)
     if not r:
+        record_verification("fingerprint", "voter_not_found")
         return jsonify(ok=False, error="voter_not_found"), 404
-    stored = r["fingerprint"] or ""
-    ok = (fp_payload == stored)
-    return jsonify(ok=bool(ok))
+    try:
+        ok = fp_verify(r["fp_template"], fp_payload)
+    except ValueError:
+        record_verification("fingerprint", "invalid_fingerprint")
+        return jsonify(ok=False, error="invalid_fingerprint"), 400
+    record_verification("fingerprint", "ok" if ok else "mismatch")
+    if not ok:
+        return jsonify(ok=False)
+    return jsonify(ok=True, ticket=issue_ticket(ticket["r"], voter_id, set(ticket["s"]) | {"fp"}))
 
 
 @APP.route("/api/cast_vote", methods=["POST"])
+@admit_write
 def api_cast_vote():
     """API endpoint to cast and record a vote."""
     data = request.get_json(force=True)
@@ -692,36 +3296,568 @@ def api_cast_vote():
     candidate = data.get("candidate", "").strip()
     if not voter_id or not candidate:
         return jsonify(ok=False, error="missing_data"), 400
-    conn = get_conn()
-    r = conn.execute("SELECT * FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
-    if not r:
-        conn.close()
+    # The ticket proves both verification steps passed for this voter row, so the
+    # only database work left is the conditional write itself.
+    ticket = read_ticket(data.get("ticket"), voter_id, stages=STAGES_FOR_VOTE)
+    if ticket is None:
+        METRICS.inc("svm_votes_total", source="kiosk", outcome="verification_required")
+        return jsonify(ok=False, error="verification_required"), 403
+    cast_at = int(time.time())
+    outcome, phone_number = run_in_transaction(voter_conn(voter_id), record_vote, voter_id, candidate, cast_at,
+                                               ticket["r"])
+    METRICS.inc("svm_votes_total", source="kiosk", outcome=outcome)
+    VOTER_CACHE.invalidate(voter_id)
+    if outcome == "recorded":
+        LEDGER_WRITER.wake()
+        EVENT_BUS.publish("vote", {"source": "kiosk", "votes": {candidate: 1}})
+    if outcome == "voter_not_found":
         return jsonify(ok=False, error="voter_not_found"), 404
-    if r["has_voted"]:
-        conn.close()
+    if outcome == "already_voted":
         return jsonify(ok=False, error="already_voted"), 403
+    if phone_number:
+        SMS_DISPATCHER.wake()
+    else:
+        logging.warning(f"Voter {voter_id} does not have a registered phone number. SMS will not be sent.")
+    return jsonify(ok=True, message="vote_recorded", timestamp=iso_from_epoch(cast_at))
 
 
-    # Check for phone number before committing the vote
-    phone_number = r["phone"]
-    if not phone_number:
-        logging.warning(f"Voter {voter_id} does not have a registered phone number. SMS will not be sent.")
+# Offline kiosk batch sync
+# Kiosks that lost connectivity buffer votes locally (verification happened on
+# the kiosk) and upload them in bulk. Each item carries a client-generated
+# idempotency key; a batch is applied in one transaction and replays return
+# the outcome recorded the first time.
+KIOSK_SYNC_TOKEN = os.environ.get("SVM_KIOSK_TOKEN", "")
+KIOSK_SYNC_MAX_ITEMS = 5000
+SYNC_OUTCOMES = {"recorded": "recorded", "already_voted": "already_voted", "voter_not_found": "unknown_voter"}
 
 
-    ts = datetime.utcnow().isoformat()
-    conn.execute("INSERT INTO votes (voter_id, candidate, timestamp) VALUES (?,?,?)", (voter_id, candidate, ts))
-    conn.execute("UPDATE voters SET has_voted=1 WHERE voter_id=?", (voter_id,))
-    conn.commit()
-    conn.close()
+def _sync_cast_at(value):
+    """Converts a kiosk-supplied ISO timestamp to epoch seconds; falls back to now when missing or invalid."""
+    try:
+        return epoch_from_iso(value)
+    except ValueError:
+        return int(time.time())
 
 
-    # Send SMS notification if a phone number exists
-    if phone_number:
-        message = f"Your vote has been successfully cast for {candidate}."
-        send_sms(phone_number, message)
+def apply_kiosk_batch(conn, kiosk_id, items):
+    """
+    Applies one uploaded batch; must run inside run_in_transaction().
+    Returns [{"key", "voter_id", "outcome", "replayed"}] in input order and the
+    voter_ids whose status changed.
+    """
+    keys = [str(item.get("key", "")) for item in items]
+    seen = {}
+    for i in range(0, len(keys), _SQL_IN_CHUNK):
+        chunk = keys[i:i + _SQL_IN_CHUNK]
+        seen.update((r["idempotency_key"], r["outcome"]) for r in conn.execute(
+            f"SELECT idempotency_key, outcome FROM kiosk_sync WHERE kiosk_id=? "
+            f"AND idempotency_key IN ({','.join('?' * len(chunk))})", [kiosk_id] + chunk))
+    results, changed, log_rows = [], [], []
+    received_at = datetime.utcnow().isoformat()
+    for key, item in zip(keys, items):
+        voter_id = str(item.get("voter_id", "")).strip()
+        candidate = str(item.get("candidate", "")).strip()
+        if key in seen:
+            results.append({"key": key, "voter_id": voter_id, "outcome": seen[key], "replayed": True})
+            continue
+        if not key or not voter_id or not candidate:
+            results.append({"key": key, "voter_id": voter_id, "outcome": "invalid", "replayed": False})
+            continue
+        outcome, _ = record_vote(conn, voter_id, candidate, _sync_cast_at(item.get("cast_at")))
+        outcome = SYNC_OUTCOMES[outcome]
+        if outcome == "recorded":
+            changed.append(voter_id)
+        seen[key] = outcome
+        log_rows.append((kiosk_id, key, voter_id, outcome, received_at))
+        results.append({"key": key, "voter_id": voter_id, "outcome": outcome, "replayed": False})
+    conn.executemany("INSERT INTO kiosk_sync (kiosk_id, idempotency_key, voter_id, outcome, received_at) "
+                     "VALUES (?, ?, ?, ?, ?)", log_rows)
+    return results, changed
+
+
+def sync_kiosk_batch(kiosk_id, items):
+    """
+    Splits a batch by shard and applies each part with apply_kiosk_batch() in its
+    own transaction; a batch is atomic per shard, and replays make a retry of a
+    partly applied batch safe. Returns the results in input order and the
+    voter_ids whose status changed.
+    """
+    by_shard = {}
+    for pos, item in enumerate(items):
+        by_shard.setdefault(shard_for(str(item.get("voter_id", "")).strip()), []).append(pos)
+    results, changed = [None] * len(items), []
+    for shard, positions in sorted(by_shard.items()):
+        part, part_changed = run_in_transaction(get_conn(shard), apply_kiosk_batch, kiosk_id,
+                                                [items[pos] for pos in positions])
+        for pos, result in zip(positions, part):
+            results[pos] = result
+        changed.extend(part_changed)
+    return results, changed
+
+
+@APP.route("/api/kiosk/sync", methods=["POST"])
+@admit_write
+def api_kiosk_sync():
+    """Batch ingestion of votes buffered by an offline kiosk."""
+    if not KIOSK_SYNC_TOKEN:
+        return jsonify(ok=False, error="sync_disabled"), 403
+    if not hmac.compare_digest(request.headers.get("X-Kiosk-Token", ""), KIOSK_SYNC_TOKEN):
+        return jsonify(ok=False, error="unauthorized"), 401
+    data = request.get_json(force=True)
+    if not isinstance(data, dict):
+        return jsonify(ok=False, error="missing_data"), 400
+    kiosk_id = str(data.get("kiosk_id", "")).strip()
+    items = data.get("votes")
+    if not kiosk_id or not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+        return jsonify(ok=False, error="missing_data"), 400
+    if len(items) > KIOSK_SYNC_MAX_ITEMS:
+        return jsonify(ok=False, error="batch_too_large", max_items=KIOSK_SYNC_MAX_ITEMS), 413
+    results, changed = sync_kiosk_batch(kiosk_id, items)
+    for voter_id in changed:
+        VOTER_CACHE.invalidate(voter_id)
+    if changed:
+        SMS_DISPATCHER.wake()
+        LEDGER_WRITER.wake()
+    counts, votes = {}, {}
+    for item, r in zip(items, results):
+        outcome = "replayed" if r["replayed"] else r["outcome"]
+        counts[outcome] = counts.get(outcome, 0) + 1
+        METRICS.inc("svm_votes_total", source="sync", outcome=outcome)
+        if r["outcome"] == "recorded" and not r["replayed"]:
+            candidate = str(item.get("candidate", "")).strip()
+            votes[candidate] = votes.get(candidate, 0) + 1
+    if votes:
+        EVENT_BUS.publish("vote", {"source": "sync", "votes": votes})
+    logging.info(f"Kiosk {kiosk_id} synced {len(items)} vote(s): {counts}")
+    return jsonify(ok=True, counts=counts, results=results)
+
+
+ADMIN_PAGE_SIZE = 50
+# Columns shown by the admin list; fingerprint templates are deliberately left out.
+VOTER_LIST_COLUMNS = "id, voter_id, name, dob, phone, has_voted"
+
+
+def _prefix_range(prefix):
+    """Returns (low, high) bounds so that `col >= low AND col < high` is an index-friendly prefix match."""
+    return prefix, prefix + "\U0010ffff"
+
+
+def _voter_filter_sql(filters):
+    """Builds the WHERE clauses and parameters for the admin voter filters."""
+    clauses, params = [], []
+    if filters.get("q"):
+        clauses.append("voter_id >= ? AND voter_id < ?")
+        params.extend(_prefix_range(filters["q"]))
+    if filters.get("name"):
+        clauses.append("name >= ? AND name < ?")
+        params.extend(_prefix_range(filters["name"]))
+    if filters.get("has_voted") in ("0", "1"):
+        clauses.append("has_voted = ?")
+        params.append(int(filters["has_voted"]))
+    return clauses, params
+
+
+def parse_list_cursor(text):
+    """Parses an admin list cursor, "id" or "id:shard", into (id, shard); None if absent or malformed."""
+    if not text:
+        return None
+    id_part, _, shard_part = str(text).partition(":")
+    try:
+        cursor = int(id_part), int(shard_part or 0)
+    except ValueError:
+        return None
+    return cursor if 0 <= cursor[1] < NUM_SHARDS else None
+
+
+def format_list_cursor(cursor):
+    """Formats an (id, shard) position as a cursor; plain "id" on an unsharded database."""
+    if cursor is None:
+        return None
+    return str(cursor[0]) if NUM_SHARDS == 1 else f"{cursor[0]}:{cursor[1]}"
+
+
+def list_voters_page(filters, after=None, before=None, limit=ADMIN_PAGE_SIZE, count=True):
+    """
+    Returns one keyset-paginated page of voters ordered by (id, shard):
+    (rows, total matching or None without `count`, cursor for the previous
+    page, cursor for the next page). Pages are located with `id > after` /
+    `id < before` rather than OFFSET, so every page costs the same however deep
+    into the roll it is; the total is a scan of the filter, so callers count
+    once rather than per page. Each shard returns at most limit + 1 rows past
+    the cursor and the sorted streams are merged; cursors are (id, shard)
+    tuples from parse_list_cursor().
+    """
+    clauses, params = _voter_filter_sql(filters)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    total, streams = (0 if count else None), []
+    for shard in all_shards():
+        if before is not None:
+            bid, bshard = before
+            page_clauses, order = clauses + ["id < ?" if shard >= bshard else "id <= ?"], "DESC"
+            page_params = params + [bid]
+        else:
+            aid, ashard = after or (0, 0)
+            page_clauses, order = clauses + ["id > ?" if shard <= ashard else "id >= ?"], "ASC"
+            page_params = params + [aid]
+        with db_conn(shard) as conn:
+            if count:
+                total += conn.execute("SELECT COUNT(*) FROM voters" + where, params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {VOTER_LIST_COLUMNS} FROM voters WHERE {' AND '.join(page_clauses)} "
+                f"ORDER BY id {order} LIMIT ?", page_params + [limit + 1]).fetchall()
+        streams.append([dict(r, shard=shard) for r in rows])
+    merged = heapq.merge(*streams, key=lambda r: (r["id"], r["shard"]), reverse=before is not None)
+    rows = list(itertools.islice(merged, limit + 1))
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+    prev_before = (rows[0]["id"], rows[0]["shard"]) if rows and has_prev else None
+    next_after = (rows[-1]["id"], rows[-1]["shard"]) if rows and has_next else None
+    return rows, total, prev_before, next_after
+
+
+VOTER_SEARCH_MAX = 100
+SEARCH_QUERY_MAX_LEN = 100
+SEARCH_CANDIDATES = 200           # FTS matches considered per pass, split over the shards
+SEARCH_MIN_SIMILARITY = 0.6
+SEARCH_MAX_TRIGRAMS = 48          # bounds the typo-tolerant pass for long queries
+
+
+def _fts_phrase(text):
+    """Quotes text as one FTS5 phrase; with the trigram tokenizer a phrase matches as a substring."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _search_score(query, row):
+    """
+    Ranks a search candidate on its best field: 3 exact, 2 prefix of the field
+    or of a word in it, 1 substring, otherwise its fuzzy similarity (below 1),
+    or 0 when that is under SEARCH_MIN_SIMILARITY.
+    """
+    q = query.casefold()
+    best = 0.0
+    fuzzy = []
+    for field in (row["voter_id"], row["name"], row["phone"]):
+        text = (field or "").casefold()
+        if not text:
+            continue
+        if text == q:
+            return 3.0
+        if text.startswith(q) or any(word.startswith(q) for word in text.split()):
+            best = max(best, 2.0)
+        elif q in text:
+            best = max(best, 1.0)
+        elif not best:
+            fuzzy += [text] + text.split()
+    if best:
+        return best
+    # SequenceMatcher caches its analysis of the second sequence, and the quick
+    # ratios are cheap upper bounds, so most candidates never reach ratio().
+    matcher = difflib.SequenceMatcher(None, "", q)
+    for text in fuzzy:
+        matcher.set_seq1(text)
+        if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+            best = max(best, matcher.ratio())
+    return 0.99 * best if best >= SEARCH_MIN_SIMILARITY else 0.0
+
+
+def _fuzzy_trigrams(query):
+    """
+    Trigrams for the typo-tolerant pass: those of every query word, plus, for
+    words under six characters, those of each adjacent transposition ("nmae"
+    shares no trigram with "name", but its variant "name" does).
+    """
+    words = query.casefold().split()
+    variants = words + [w[:i] + w[i + 1] + w[i] + w[i + 2:] for w in words if len(w) < 6 for i in range(len(w) - 1)]
+    grams = [v[i:i + 3] for v in variants for i in range(len(v) - 2)]
+    return list(dict.fromkeys(grams))[:SEARCH_MAX_TRIGRAMS]
+
+
+def _fuzzy_match_sql(grams):
+    """Voter ids matching any of the trigrams, most trigrams hit first."""
+    branches = " UNION ALL ".join(["SELECT rowid FROM voters_fts WHERE voters_fts MATCH ?"] * len(grams))
+    return f"id IN (SELECT rowid FROM ({branches}) GROUP BY rowid ORDER BY COUNT(*) DESC LIMIT ?)"
+
+
+def _case_variants(prefix):
+    """Every upper/lower-case spelling of a short prefix, for case-insensitive range scans of a BINARY index."""
+    return ["".join(chars) for chars in itertools.product(*({c.lower(), c.upper()} for c in prefix))]
+
+
+def search_voters(query, limit):
+    """
+    Ranked voter search over name, voter_id and phone on every shard. Each shard
+    contributes voter_id prefix matches (by index), trigram substring matches
+    (case-insensitive name prefixes for queries under three characters) and,
+    when that leaves the page short, the voters sharing the most trigrams with
+    the query; candidates are scored by _search_score() and the best `limit` returned.
+    """
+    query = query.strip()[:SEARCH_QUERY_MAX_LEN]
+    candidates = max(limit, SEARCH_CANDIDATES // NUM_SHARDS)
+    found = []
+    for shard in all_shards():
+        rows = {}
+        with db_conn(shard) as conn:
+            def collect(sql, params):
+                for r in conn.execute(f"SELECT {VOTER_LIST_COLUMNS} FROM voters WHERE {sql}", params):
+                    rows.setdefault(r["id"], dict(r, shard=shard))
+
+            collect("voter_id >= ? AND voter_id < ? ORDER BY voter_id LIMIT ?", (*_prefix_range(query), limit))
+            if len(query) >= 3:
+                collect("id IN (SELECT rowid FROM voters_fts WHERE voters_fts MATCH ? LIMIT ?)",
+                        (_fts_phrase(query), candidates))
+            else:
+                for variant in _case_variants(query):
+                    collect("name >= ? AND name < ? ORDER BY name LIMIT ?", (*_prefix_range(variant), limit))
+            grams = _fuzzy_trigrams(query)
+            if len(rows) < limit and grams:
+                collect(_fuzzy_match_sql(grams), (*(_fts_phrase(g) for g in grams), candidates))
+        for row in rows.values():
+            row["score"] = round(_search_score(query, row), 3)
+            if row["score"]:
+                found.append(row)
+    found.sort(key=lambda r: (-r["score"], r["name"] or "", r["voter_id"] or ""))
+    return found[:limit]
+
+
+UNDERAGE_LIST_MAX = 1000
+
+
+def eligibility_stats():
+    """Registered, eligible, underage and turnout figures for election day, summed over all shards."""
+    day = election_day()
+    cutoff = eligibility_cutoff(day)
+    totals = {"eligible": 0, "voted": 0, "underage": 0, "invalid_dob": 0}
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            eligible, voted = conn.execute(
+                "SELECT COUNT(*), TOTAL(has_voted) FROM voters WHERE dob_int <= ?", (cutoff,)).fetchone()
+            totals["eligible"] += eligible
+            totals["voted"] += int(voted)
+            totals["underage"] += conn.execute(
+                "SELECT COUNT(*) FROM voters WHERE dob_int > ?", (cutoff,)).fetchone()[0]
+            totals["invalid_dob"] += conn.execute(
+                "SELECT COUNT(*) FROM voters WHERE dob_int IS NULL").fetchone()[0]
+    totals["registered"] = totals["eligible"] + totals["underage"] + totals["invalid_dob"]
+    totals["turnout_pct"] = round(100.0 * totals["voted"] / totals["eligible"], 2) if totals["eligible"] else 0.0
+    born_by = f"{cutoff // 10000:04d}-{cutoff // 100 % 100:02d}-{cutoff % 100:02d}"
+    return {"election_day": day.isoformat(), "born_on_or_before": born_by, **totals}
+
+
+def list_underage(limit):
+    """Returns up to `limit` voters under age on election day, oldest first, merged over all shards."""
+    cutoff = eligibility_cutoff()
+    streams = []
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            streams.append([dict(r) for r in conn.execute(
+                "SELECT voter_id, name, dob, dob_int FROM voters WHERE dob_int > ? ORDER BY dob_int LIMIT ?",
+                (cutoff, limit))])
+    voters = list(itertools.islice(heapq.merge(*streams, key=lambda r: r["dob_int"]), limit))
+    for v in voters:
+        v["age"] = age_from_dob_int(v.pop("dob_int"))
+    return voters
+
+
+# --------------------
+# Turnout analytics
+# --------------------
+# Votes are folded, as they are loaded, into NumPy count tables keyed by the
+# minute they were cast and by the voter's dob_int (one column per candidate),
+# and voter DOBs into a count table of registrations. Loading is incremental
+# by row id and queries only touch the distinct minutes / DOBs (thousands of
+# rows however many millions of votes), so they are a few vectorized passes.
+# Votes are append-only; voters can be edited or deleted, so registrations
+# are reloaded in full every ANALYTICS_VOTER_RESYNC_S.
+ANALYTICS_REFRESH_S = 1.0         # at most one incremental load per second per process
+ANALYTICS_VOTER_RESYNC_S = 300.0
+ANALYTICS_LOAD_BATCH = 100000
+ANALYTICS_MAX_BUCKETS = 10000
+AGE_BANDS = (VOTING_AGE, 25, 35, 45, 55, 65)
+
 
+class CountTable:
+    """Counts per (sorted int64 key, column), grown by vectorized merges."""
 
-    return jsonify(ok=True, message="vote_recorded", timestamp=ts)
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+
+    def add(self, keys, columns, width):
+        """Counts one occurrence per (keys[i], columns[i]); the table widens to `width` columns."""
+        width = max(width, self.counts.shape[1])
+        batch_keys, inverse = np.unique(keys, return_inverse=True)
+        batch = np.bincount(inverse * width + columns, minlength=len(batch_keys) * width).reshape(-1, width)
+        pos = np.searchsorted(self.keys, batch_keys)
+        known = width == self.counts.shape[1] and len(self.keys) and \
+            np.array_equal(self.keys[np.minimum(pos, len(self.keys) - 1)], batch_keys)
+        if known:
+            self.counts[pos] += batch
+            return
+        merged = np.union1d(self.keys, batch_keys)
+        counts = np.zeros((len(merged), width), dtype=np.int64)
+        counts[np.searchsorted(merged, self.keys), :self.counts.shape[1]] = self.counts
+        counts[np.searchsorted(merged, batch_keys)] += batch
+        self.keys, self.counts = merged, counts
+
+    def snapshot(self, width):
+        """Returns a copy of (keys, counts) with at least `width` columns."""
+        return self.keys.copy(), np.pad(self.counts, ((0, 0), (0, max(0, width - self.counts.shape[1]))))
+
+
+class VoteAnalytics:
+    """Per-process vote and registration count tables over all shards, refreshed incrementally."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.by_minute = CountTable()        # key: cast_at // 60, column: candidate
+        self.by_dob = CountTable()           # key: voter dob_int (0 if unknown), column: candidate
+        self.registered = CountTable()       # key: dob_int (0 if unknown), one column
+        self.names = []
+        self._name_index = {}
+        self._shards = {}
+        self._source = (get_router().base_path, NUM_SHARDS)
+        self._refreshed = 0.0
+        self._voters_loaded = 0.0
+
+    def snapshot(self):
+        """Refreshes if stale; returns (by_minute, by_dob, registered) as (keys, counts) pairs, and names."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._refreshed >= ANALYTICS_REFRESH_S:
+                if self._source != (get_router().base_path, NUM_SHARDS):
+                    self._reset()  # create_app() pointed this process at another database
+                if now - self._voters_loaded >= ANALYTICS_VOTER_RESYNC_S:
+                    self.registered = CountTable()
+                    for state in self._shards.values():
+                        state["voter_id"] = 0
+                    self._voters_loaded = now
+                for shard in all_shards():
+                    self._load_shard(shard)
+                self._refreshed = now
+            width = len(self.names)
+            return (self.by_minute.snapshot(width), self.by_dob.snapshot(width), self.registered.snapshot(1),
+                    list(self.names))
+
+    def _candidate_lut(self, conn, state):
+        """Maps the shard's candidate ids to global name indexes (candidate ids differ per shard)."""
+        rows = conn.execute("SELECT id, name FROM candidates").fetchall()
+        lut = np.full(max(r[0] for r in rows) + 1, -1, dtype=np.int64)
+        for cid, name in rows:
+            if name not in self._name_index:
+                self._name_index[name] = len(self.names)
+                self.names.append(name)
+            lut[cid] = self._name_index[name]
+        state["lut"] = lut
+        return lut
+
+    def _load_shard(self, shard):
+        state = self._shards.setdefault(shard, {"vote_id": 0, "voter_id": 0, "lut": np.empty(0, np.int64)})
+        with db_conn(shard) as conn:
+            while True:
+                rows = conn.execute(
+                    "SELECT v.id, v.cast_at, v.candidate_id, COALESCE(r.dob_int, 0) FROM votes v "
+                    "LEFT JOIN voters r ON r.voter_id = v.voter_id WHERE v.id > ? ORDER BY v.id LIMIT ?",
+                    (state["vote_id"], ANALYTICS_LOAD_BATCH)).fetchall()
+                if not rows:
+                    break
+                cols = np.array(rows, dtype=np.int64)
+                lut = state["lut"]
+                if cols[:, 2].max() >= len(lut) or (lut[cols[:, 2]] < 0).any():
+                    lut = self._candidate_lut(conn, state)
+                candidate = lut[cols[:, 2]]
+                self.by_minute.add(cols[:, 1] // 60, candidate, len(self.names))
+                self.by_dob.add(cols[:, 3], candidate, len(self.names))
+                state["vote_id"] = int(cols[-1, 0])
+            while True:
+                rows = conn.execute("SELECT id, COALESCE(dob_int, 0) FROM voters WHERE id > ? ORDER BY id LIMIT ?",
+                                    (state["voter_id"], ANALYTICS_LOAD_BATCH)).fetchall()
+                if not rows:
+                    break
+                cols = np.array(rows, dtype=np.int64)
+                self.registered.add(cols[:, 1], np.zeros(len(cols), dtype=np.int64), 1)
+                state["voter_id"] = int(cols[-1, 0])
+
+
+VOTE_ANALYTICS = VoteAnalytics()
+
+
+def _time_grid(by_minute, bucket, since, until):
+    """Sums the per-minute table into `bucket`-second rows over [since, until); returns (start, grid)."""
+    keys, counts = by_minute
+    mask = np.ones(len(keys), dtype=bool)
+    if since is not None:
+        mask &= keys >= since // 60
+    if until is not None:
+        mask &= keys < -(-until // 60)
+    keys, counts = keys[mask], counts[mask]
+    if not len(keys):
+        return 0, np.zeros((0, counts.shape[1]), dtype=np.int64)
+    start = (since if since is not None else int(keys[0]) * 60) // bucket * bucket
+    rows = (keys * 60 - start) // bucket
+    if rows[-1] >= ANALYTICS_MAX_BUCKETS:
+        raise ValueError("too_many_buckets")
+    grid = np.zeros((int(rows[-1]) + 1, counts.shape[1]), dtype=np.int64)
+    np.add.at(grid, rows, counts)
+    return start, grid
+
+
+def votes_by_time(bucket=3600, since=None, until=None):
+    """Votes per time bucket (default hourly) per candidate, with totals and the cumulative curve."""
+    by_minute, _, _, names = VOTE_ANALYTICS.snapshot()
+    start, grid = _time_grid(by_minute, bucket, since, until)
+    totals = grid.sum(axis=1)
+    return {
+        "bucket_seconds": bucket,
+        "buckets": [iso_from_epoch(start + i * bucket) for i in range(len(grid))],
+        "candidates": {name: grid[:, i].tolist() for i, name in enumerate(names)},
+        "totals": totals.tolist(),
+        "cumulative": np.cumsum(totals).tolist(),
+    }
+
+
+def turnout_curve(bucket=3600, since=None, until=None):
+    """Cumulative votes over time as a percentage of voters eligible on election day."""
+    by_minute, _, (dobs, registered), _ = VOTE_ANALYTICS.snapshot()
+    start, grid = _time_grid(by_minute, bucket, since, until)
+    cumulative = np.cumsum(grid.sum(axis=1))
+    eligible = int(registered[(dobs > 0) & (dobs <= eligibility_cutoff()), 0].sum())
+    return {
+        "bucket_seconds": bucket,
+        "eligible": eligible,
+        "buckets": [iso_from_epoch(start + i * bucket) for i in range(len(grid))],
+        "cumulative": cumulative.tolist(),
+        "turnout_pct": (np.round(100.0 * cumulative / eligible, 2) if eligible else cumulative * 0.0).tolist(),
+    }
+
+
+def turnout_by_age_band():
+    """Registered voters, votes, turnout and per-candidate votes per age band on election day."""
+    _, (vote_dobs, votes), (dobs, registered), names = VOTE_ANALYTICS.snapshot()
+    labels = ["unknown", f"under {VOTING_AGE}"] + [
+        f"{lo}-{hi - 1}" for lo, hi in zip(AGE_BANDS, AGE_BANDS[1:])] + [f"{AGE_BANDS[-1]}+"]
+    day = date_int(election_day())
+
+    def band_of(dob):
+        # 0: unknown DOB, 1: under age, 2..: AGE_BANDS
+        return np.where(dob > 0, np.digitize((day - dob) // 10000, AGE_BANDS) + 1, 0)
+
+    registered = np.bincount(band_of(dobs), weights=registered[:, 0], minlength=len(labels)).astype(np.int64)
+    grid = np.zeros((len(labels), len(names)), dtype=np.int64)
+    np.add.at(grid, band_of(vote_dobs), votes)
+    voted = grid.sum(axis=1)
+    return {"election_day": election_day().isoformat(), "bands": [
+        {"band": label, "registered": int(registered[i]), "voted": int(voted[i]),
+         "turnout_pct": round(100.0 * voted[i] / registered[i], 2) if registered[i] else 0.0,
+         "candidates": {name: int(grid[i, j]) for j, name in enumerate(names)}}
+        for i, label in enumerate(labels)]}
 
 
 # --- Admin routes ---
@@ -730,7 +3866,7 @@ def admin_login():
     """Admin login page."""
     if session.get("admin"):
         return redirect(url_for("admin_list"))
-    return render_template_string(ADMIN_LOGIN_HTML)
+    return render_template("admin_login.html")
 
 
 @APP.route("/admin", methods=["POST"])
@@ -756,13 +3892,207 @@ def admin_logout():
 
 @APP.route("/admin/list")
 def admin_list():
-    """Lists all registered voters."""
+    """Lists registered voters, one filtered page at a time, or the best matches for ?search=."""
+    if not session.get("admin"):
+        return redirect(url_for("admin_login"))
+    search = request.args.get("search", "").strip()
+    if search:
+        voters = search_voters(search, ADMIN_PAGE_SIZE)
+        return render_template("admin_list.html", voters=voters, total=len(voters), search=search,
+                               filters={"q": "", "name": "", "has_voted": ""}, link_filters={},
+                               prev_before=None, next_after=None)
+    filters = {
+        "q": request.args.get("q", "").strip(),
+        "name": request.args.get("name", "").strip(),
+        "has_voted": request.args.get("has_voted", "").strip(),
+    }
+    after = parse_list_cursor(request.args.get("after"))
+    before = parse_list_cursor(request.args.get("before"))
+    # Only the first page counts the matches; the paging links carry the figure on.
+    first_page = after is None and before is None
+    voters, total, prev_before, next_after = list_voters_page(filters, after=after, before=before,
+                                                              count=first_page)
+    if not first_page:
+        total = request.args.get("total", type=int)
+    link_filters = {k: v for k, v in filters.items() if v}
+    if total is not None:
+        link_filters["total"] = total
+    return render_template("admin_list.html", voters=voters, total=total, filters=filters,
+                           link_filters=link_filters, prev_before=format_list_cursor(prev_before),
+                           next_after=format_list_cursor(next_after))
+
+
+@APP.route("/admin/results")
+def admin_results():
+    """Returns the live vote totals as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    tallies = all_tallies()
+    return jsonify(ok=True, total=sum(tallies.values()), results=tallies)
+
+
+@APP.route("/admin/dashboard")
+def admin_dashboard():
+    """Live turnout and tallies page, fed by /admin/events."""
     if not session.get("admin"):
         return redirect(url_for("admin_login"))
-    conn = get_conn()
-    voters = conn.execute("SELECT * FROM voters").fetchall()
-    conn.close()
-    return render_template_string(ADMIN_LIST_HTML, voters=voters)
+    return render_template("admin_dashboard.html")
+
+
+@APP.route("/admin/events")
+def admin_events():
+    """Server-sent event stream for the live dashboard: a snapshot, then vote and verification deltas."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    sub = EVENT_BUS.subscribe()
+    if sub is None:
+        return jsonify(ok=False, error="too_many_subscribers"), 503
+
+    def stream():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            yield sse_message("snapshot", EVENT_BUS.snapshot())
+            while True:
+                message = EVENT_BUS.next_message(sub)
+                if message is EVENT_BUS.CLOSED:
+                    return
+                yield message if message is not None else ": keep-alive\n\n"
+        finally:
+            EVENT_BUS.unsubscribe(sub)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@APP.route("/admin/results/check")
+def admin_results_check():
+    """Compares the live tallies against a full recount of the votes table."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    mismatches = check_all_tallies()
+    return jsonify(ok=not mismatches,
+                   mismatches={c: {"tally": t, "recount": n} for c, (t, n) in mismatches.items()})
+
+
+@APP.route("/admin/eligibility")
+def admin_eligibility():
+    """Eligible, underage and turnout counts for election day as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    return jsonify(ok=True, **eligibility_stats())
+
+
+@APP.route("/admin/ledger")
+def admin_ledger():
+    """Per-shard ledger heads as JSON, for publishing the chain's latest hash outside the system."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    return jsonify(ok=True, shards=[{"shard": shard, "head": ledger_head(shard)} for shard in all_shards()])
+
+
+@APP.route("/admin/search")
+def admin_search():
+    """Ranked voter search by name, voter_id or phone (prefix, substring, typo-tolerant) as JSON; ?q=&limit=."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify(ok=False, error="missing_query"), 400
+    limit = min(max(request.args.get("limit", 20, type=int), 1), VOTER_SEARCH_MAX)
+    voters = search_voters(query, limit)
+    return jsonify(ok=True, count=len(voters), voters=voters)
+
+
+@APP.route("/admin/eligibility/underage")
+def admin_underage():
+    """Lists registered voters who are under age on election day, oldest first, as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    limit = min(max(request.args.get("limit", ADMIN_PAGE_SIZE, type=int), 1), UNDERAGE_LIST_MAX)
+    voters = list_underage(limit)
+    return jsonify(ok=True, count=len(voters), voters=voters)
+
+
+def _analytics_window():
+    """
+    Reads bucket (whole minutes, in seconds) and optional from/to ISO times from
+    the query string; from/to are rounded out to whole minutes. Raises ValueError.
+    """
+    bucket = request.args.get("bucket", 3600, type=int)
+    if not 60 <= bucket <= 7 * 86400 or bucket % 60:
+        raise ValueError("bucket")
+    since, until = (request.args.get(k, "").strip() for k in ("from", "to"))
+    return bucket, epoch_from_iso(since) if since else None, epoch_from_iso(until) if until else None
+
+
+@APP.route("/admin/analytics/votes")
+def admin_analytics_votes():
+    """Votes per time bucket (default hourly) per candidate as JSON; ?bucket=&from=&to=."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    try:
+        return jsonify(ok=True, **votes_by_time(*_analytics_window()))
+    except ValueError:
+        return jsonify(ok=False, error="invalid_window", max_buckets=ANALYTICS_MAX_BUCKETS), 400
+
+
+@APP.route("/admin/analytics/turnout")
+def admin_analytics_turnout():
+    """Cumulative turnout curve as JSON; ?bucket=&from=&to=."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    try:
+        return jsonify(ok=True, **turnout_curve(*_analytics_window()))
+    except ValueError:
+        return jsonify(ok=False, error="invalid_window", max_buckets=ANALYTICS_MAX_BUCKETS), 400
+
+
+@APP.route("/admin/analytics/age-bands")
+def admin_analytics_age_bands():
+    """Registrations, turnout and per-candidate votes by age band on election day as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    return jsonify(ok=True, **turnout_by_age_band())
+
+
+@APP.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint for this process."""
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    cache = VOTER_CACHE.stats()
+    sampled = {"svm_voter_cache_hits_total": cache["hits"], "svm_voter_cache_misses_total": cache["misses"],
+               "svm_voter_cache_entries": cache["size"], "svm_sse_subscribers": EVENT_BUS.subscriber_count()}
+    if STORAGE_MODE == "memory":
+        durable = [p.stat().st_mtime for p in get_router().paths if p.exists()]
+        if durable:
+            sampled["svm_backup_age_seconds"] = round(time.time() - min(durable), 3)
+    return Response(METRICS.render(sampled), mimetype="text/plain; version=0.0.4")
+
+
+@APP.route("/admin/cache/stats")
+def admin_cache_stats():
+    """Reports voter cache hit/miss counters as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    return jsonify(ok=True, **VOTER_CACHE.stats())
+
+
+@APP.route("/admin/fingerprints/duplicates")
+def admin_fp_duplicates():
+    """Batch job: lists every pair of voters whose enrolled fingerprints match."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    pairs = find_fp_duplicates(request.args.get("threshold", type=float))
+    return jsonify(ok=True, count=len(pairs), duplicates=pairs)
+
+
+@APP.route("/admin/sms/status")
+def admin_sms_status():
+    """Reports SMS queue depth and delivery lag as JSON."""
+    if not session.get("admin"):
+        return jsonify(ok=False, error="unauthorized"), 401
+    return jsonify(ok=True, **sms_queue_stats())
 
 
 @APP.route("/admin/add", methods=["GET", "POST"])
@@ -773,23 +4103,70 @@ def admin_add():
     if request.method == "POST":
         voter_id = request.form.get("voter_id")
         name = request.form.get("name")
-        dob = request.form.get("dob")
+        dob = canonical_dob(request.form.get("dob"))
         phone = request.form.get("phone")
-        fingerprint = request.form.get("fingerprint")
-        conn = get_conn()
         try:
-            conn.execute(
-                "INSERT INTO voters (voter_id, name, dob, phone, fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                (voter_id, name, dob, phone, fingerprint, datetime.utcnow().isoformat())
+            template = fp_template_blob(request.form.get("fingerprint"))
+        except ValueError as e:
+            flash(f"Error: {e}.", "error")
+            return redirect(url_for("admin_add"))
+        shard = shard_for(voter_id)
+        conn = get_conn(shard)
+        duplicate = fp_duplicate_of(template)
+        if duplicate:
+            flash(f"Error: this fingerprint is already enrolled for voter {duplicate}.", "error")
+            return redirect(url_for("admin_add"))
+        try:
+            cur = conn.execute(
+                "INSERT INTO voters (voter_id, name, dob, phone, fp_template, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (voter_id, name, dob, phone, template, datetime.utcnow().isoformat())
             )
+            generation = bump_fp_generation(conn) if template else None
             conn.commit()
+            if template:
+                fp_index_apply(shard, cur.lastrowid, template, generation)
             flash(f"Voter {name} added successfully!", "success")
         except sqlite3.IntegrityError:
+            conn.rollback()
             flash("Error: Voter ID already exists.", "error")
-        finally:
-            conn.close()
         return redirect(url_for("admin_add"))
-    return render_template_string(ADMIN_ADD_HTML)
+    return render_template("admin_add.html", fp_dim=FP_DIM)
+
+
+@APP.route("/admin/import", methods=["GET", "POST"])
+def admin_import():
+    """Bulk-imports voters from an uploaded CSV or NDJSON file."""
+    if not session.get("admin"):
+        return redirect(url_for("admin_login"))
+    report = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a file to import.", "error")
+            return redirect(url_for("admin_import"))
+        fmt = import_format_for(upload.filename, request.form.get("format"))
+        # Werkzeug spools large uploads to a temporary file; wrap it so rows are parsed as they are read.
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        report = import_voters(iter_voter_records(stream, fmt))
+        logging.info(f"Bulk import of {upload.filename}: {report['imported']} imported, {report['failed']} rejected")
+    return render_template("admin_import.html", report=report)
+
+
+@APP.route("/admin/export/<table>.<fmt>")
+def admin_export(table, fmt):
+    """Streams the voters roll or the votes ledger as CSV or NDJSON."""
+    if not session.get("admin"):
+        return redirect(url_for("admin_login"))
+    if table not in EXPORT_TABLES or fmt not in EXPORT_MIMETYPES:
+        abort(404)
+    filters = {k: request.args.get(k, "").strip() for k in ("from", "to", "has_voted")}
+    try:
+        export_query(table, filters)
+    except ValueError:
+        abort(400)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return Response(stream_with_context(iter_export(table, fmt, filters)), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={table}-{stamp}.{fmt}"})
 
 
 @APP.route("/admin/edit/<voter_id>", methods=["GET", "POST"])
@@ -797,27 +4174,39 @@ def admin_edit(voter_id):
     """Edits an existing voter."""
     if not session.get("admin"):
         return redirect(url_for("admin_login"))
-    conn = get_conn()
+    shard = shard_for(voter_id)
+    conn = get_conn(shard)
     voter = conn.execute("SELECT * FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
     if not voter:
-        conn.close()
         flash("Voter not found.", "error")
         return redirect(url_for("admin_list"))
     if request.method == "POST":
         name = request.form.get("name")
-        dob = request.form.get("dob")
+        dob = canonical_dob(request.form.get("dob"))
         phone = request.form.get("phone")
-        fingerprint = request.form.get("fingerprint")
+        try:
+            new_template = fp_template_blob(request.form.get("fingerprint"))
+        except ValueError as e:
+            flash(f"Error: {e}.", "error")
+            return redirect(url_for("admin_edit", voter_id=voter_id))
+        template = new_template or voter["fp_template"]
+        changed = template != voter["fp_template"]
+        duplicate = fp_duplicate_of(template, exclude=fp_key(shard, voter["id"])) if changed else None
+        if duplicate:
+            flash(f"Error: this fingerprint is already enrolled for voter {duplicate}.", "error")
+            return redirect(url_for("admin_edit", voter_id=voter_id))
         conn.execute(
-            "UPDATE voters SET name=?, dob=?, phone=?, fingerprint=? WHERE voter_id=?",
-            (name, dob, phone, fingerprint, voter_id)
+            "UPDATE voters SET name=?, dob=?, phone=?, fp_template=? WHERE voter_id=?",
+            (name, dob, phone, template, voter_id)
         )
+        generation = bump_fp_generation(conn) if changed else None
         conn.commit()
+        if changed:
+            fp_index_apply(shard, voter["id"], template, generation)
+        VOTER_CACHE.invalidate(voter_id)
         flash(f"Voter {voter_id} updated successfully!", "success")
-        conn.close()
         return redirect(url_for("admin_list"))
-    conn.close()
-    return render_template_string(ADMIN_EDIT_HTML, voter=voter)
+    return render_template("admin_edit.html", voter=voter)
 
 
 @APP.route("/admin/delete/<voter_id>", methods=["POST"])
@@ -825,10 +4214,15 @@ def admin_delete(voter_id):
     """Deletes a voter from the database."""
     if not session.get("admin"):
         return redirect(url_for("admin_login"))
-    conn = get_conn()
+    shard = shard_for(voter_id)
+    conn = get_conn(shard)
+    r = conn.execute("SELECT id, fp_template FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
     conn.execute("DELETE FROM voters WHERE voter_id=?", (voter_id,))
+    generation = bump_fp_generation(conn) if r and r["fp_template"] else None
     conn.commit()
-    conn.close()
+    if generation:
+        fp_index_apply(shard, r["id"], None, generation)
+    VOTER_CACHE.invalidate(voter_id)
     flash(f"Voter {voter_id} deleted.", "success")
     return redirect(url_for("admin_list"))
 
@@ -842,22 +4236,256 @@ def admin_update_voted_status(voter_id):
     if password != VOTED_STATUS_PASSWORD:
         flash("Incorrect password for status change.", "error")
         return redirect(url_for("admin_list"))
-    conn = get_conn()
+    conn = voter_conn(voter_id)
     r = conn.execute("SELECT has_voted FROM voters WHERE voter_id=?", (voter_id,)).fetchone()
     if r:
         current_status = r["has_voted"]
         new_status = 1 - current_status
         conn.execute("UPDATE voters SET has_voted=? WHERE voter_id=?", (new_status, voter_id))
         conn.commit()
+        VOTER_CACHE.invalidate(voter_id)
         flash(f"Voted status for {voter_id} updated to {'Yes' if new_status else 'No'}.", "success")
     else:
         flash("Voter not found.", "error")
-    conn.close()
     return redirect(url_for("admin_list"))
 
 
+# App factory and serving
+# Importing the module only defines APP and its routes; create_app() applies
+# configuration, creates or migrates the database and warms the process up.
+# External WSGI servers should load "smart_voting_system:create_app()".
+# `serve` is the production mode: the parent migrates and warms up once, then
+# pre-forks WORKERS processes that accept on one shared listening socket and
+# share the WAL database. SIGTERM/SIGINT stop accepting, let in-flight requests
+# finish and exit; workers that die unexpectedly are replaced.
+BIND = os.environ.get("SVM_BIND", "0.0.0.0:5000")
+WORKERS = int(os.environ.get("SVM_WORKERS", str(os.cpu_count() or 1)))
+WORKER_KEEPALIVE_S = 15      # idle keep-alive connections are dropped after this
+SHUTDOWN_TIMEOUT_S = float(os.environ.get("SVM_SHUTDOWN_TIMEOUT", "30"))
+LISTEN_BACKLOG = 1024
+
+
+def create_app(db_path=None, shards=None, pool_size=None, storage=None, backup_interval=None):
+    """Configures, initializes and warms up the app; arguments override the SVM_* environment."""
+    global DB_PATH, NUM_SHARDS, DB_POOL_SIZE, STORAGE_MODE, BACKUP_INTERVAL_S
+    if db_path is not None:
+        DB_PATH = Path(db_path)
+    if shards is not None:
+        NUM_SHARDS = max(1, int(shards))
+    if pool_size is not None:
+        DB_POOL_SIZE = int(pool_size)
+    if storage is not None:
+        STORAGE_MODE = storage
+    if STORAGE_MODE not in STORAGE_MODES:
+        raise ValueError(f"unknown storage mode {STORAGE_MODE!r}; expected one of {', '.join(STORAGE_MODES)}")
+    if backup_interval is not None:
+        BACKUP_INTERVAL_S = float(backup_interval)
+    if STORAGE_MODE == "memory":
+        load_working_copies()
+    init_db()
+    warmup()
+    return APP
+
+
+def warmup():
+    """
+    Compiles templates, renders the voting page and opens a connection per
+    shard. The fingerprint index is left to load on first use: only enrollment
+    and the admin duplicate check need it, and it is large.
+    """
+    warm_templates()
+    with APP.test_request_context("/"):
+        _index_page()
+    for shard in all_shards():
+        with db_conn(shard) as conn:
+            conn.execute("SELECT COUNT(*) FROM voters").fetchone()
+
+
+def parse_bind(bind):
+    """Splits "host:port" (host optional) into (host, port)."""
+    host, _, port = str(bind).rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+class _WorkerRequestHandler(WSGIRequestHandler):
+    # A socket timeout bounds idle keep-alive connections, so a graceful
+    # shutdown only waits for requests that are actually running.
+    timeout = WORKER_KEEPALIVE_S
+
+
+def _run_worker(sock):
+    """Serves on the shared socket until SIGTERM/SIGINT, then drains in-flight requests and cleans up."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, APP, threaded=True, request_handler=_WorkerRequestHandler, fd=sock.fileno())
+    server.daemon_threads = False    # let server_close() join the request threads
+    server.block_on_close = True
+    warmup()
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    logging.info(f"Worker {os.getpid()} serving on {host}:{port}")
+    stop.wait()
+    EVENT_BUS.close()
+    server.shutdown()
+    server.server_close()
+    SMS_DISPATCHER.stop()
+    LEDGER_WRITER.stop()
+    BACKUPS.stop()
+    save_fp_index()
+    close_pool()
+    logging.info(f"Worker {os.getpid()} stopped")
+
+
+def _spawn_worker(sock):
+    """Forks one worker process; returns its pid."""
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        _run_worker(sock)
+    except BaseException:
+        logging.exception(f"Worker {os.getpid()} crashed")
+        code = 1
+    finally:
+        os._exit(code)  # never unwind into the parent's stack
+
+
+def serve_production(bind=BIND, workers=WORKERS):
+    """Runs the pre-fork production server for an app set up by create_app(); returns the exit code."""
+    host, port = parse_bind(bind)
+    close_pool()  # connections must not cross fork(); workers open their own
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log lines
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    logging.info(f"Serving on {host}:{port} with {workers} worker(s), DB {', '.join(map(str, get_router().paths))}")
+    if workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(sock)
+        return 0
+
+    stopping = []
+
+    def request_stop(signum, _frame):
+        if not stopping:
+            logging.info("Shutting down workers")
+            stopping.append(time.monotonic() + SHUTDOWN_TIMEOUT_S)
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    children = {}
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    for _ in range(workers):
+        children[_spawn_worker(sock)] = time.monotonic()
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if not pid:
+            if stopping and time.monotonic() > stopping[0]:
+                for pid in children:
+                    os.kill(pid, signal.SIGKILL)
+                stopping[0] = float("inf")
+            BACKUPS.run_if_due()
+            time.sleep(0.2)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logging.warning(f"Worker {pid} exited with status {status}; starting a replacement")
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)  # crash loop: do not fork as fast as the workers die
+        children[_spawn_worker(sock)] = time.monotonic()
+    sock.close()
+    logging.info("All workers stopped")
+    return 0
+
+
 # Start
-if __name__ == "__main__":
+def cli_import_voters(args):
+    """Command-line bulk import; prints the JSON report."""
+    fmt = import_format_for(args.path, args.format)
+    with open(args.path, encoding="utf-8-sig", newline="") as stream:
+        report = import_voters(iter_voter_records(stream, fmt), batch_size=args.batch_size)
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+def cli_find_duplicates(args):
+    """Command-line batch duplicate-enrollment scan; prints JSON."""
+    pairs = find_fp_duplicates(args.threshold)
+    print(json.dumps({"count": len(pairs), "duplicates": pairs}, indent=2))
+    return 0
+
+
+def cli_verify_ledger(args):
+    """Command-line ledger verification; prints a JSON report and exits non-zero on tampering."""
+    if args.flush:
+        LEDGER_WRITER.flush()
+    reports = [verify_ledger(shard, args.max_errors) for shard in all_shards()]
+    print(json.dumps({"ok": all(r["ok"] for r in reports), "shards": reports}, indent=2))
+    return 0 if all(r["ok"] for r in reports) else 1
+
+
+def cli_fetch_assets(args):
+    """Downloads the vendor assets into static/ so kiosks stop fetching them from CDNs."""
+    import urllib.request
+    for name, (rel, cdn) in VENDOR_ASSETS.items():
+        path = STATIC_DIR / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with urllib.request.urlopen(cdn, timeout=30) as resp:
+            path.write_bytes(resp.read())
+        print(f"{name}: {cdn} -> {path}")
+    return 0
+
+
+def main(argv=None):
+    """Command-line entry point: runs the development server by default."""
+    parser = argparse.ArgumentParser(description="Smart Voting Machine")
+    parser.add_argument("--db", help="database path (default: SVM_DB_PATH or svm_admin.db)")
+    parser.add_argument("--shards", type=int, help="number of database shards (default: SVM_SHARDS or 1)")
+    parser.add_argument("--pool-size", type=int, help="pooled connections per shard (default: SVM_DB_POOL_SIZE)")
+    parser.add_argument("--storage", choices=STORAGE_MODES, help="disk, or memory with periodic backups to --db "
+                                                               "(default: SVM_STORAGE or disk)")
+    parser.add_argument("--backup-interval", type=float,
+                        help="memory storage: seconds between backups, the most work a crash can lose "
+                             "(default: SVM_BACKUP_INTERVAL or 30)")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("serve", help="run the pre-fork production server")
+    p.add_argument("--bind", default=BIND, help="host:port to listen on (default: SVM_BIND or 0.0.0.0:5000)")
+    p.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: SVM_WORKERS or CPUs)")
+    p.add_argument("--dev", action="store_true", help="run the single-process debug server instead")
+    p = sub.add_parser("import-voters", help="bulk-import voters from a CSV or NDJSON file")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("csv", "ndjson"))
+    p.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    sub.add_parser("fetch-assets", help="download the QR library and fonts into static/")
+    p = sub.add_parser("find-duplicates", help="list voters enrolled with matching fingerprints")
+    p.add_argument("--threshold", type=float)
+    p = sub.add_parser("verify-ledger", help="check the hash-chained vote ledger against the votes table")
+    p.add_argument("--flush", action="store_true", help="append pending votes to the ledger first")
+    p.add_argument("--max-errors", type=int, default=100, help="errors listed per shard (default: 100)")
+    args = parser.parse_args(argv)
+
+    if args.command == "fetch-assets":
+        return cli_fetch_assets(args)
+    create_app(args.db, args.shards, args.pool_size, args.storage, args.backup_interval)
+    if args.command == "serve" and not args.dev:
+        return serve_production(args.bind, args.workers)
+    if args.command == "import-voters":
+        return cli_import_voters(args)
+    if args.command == "find-duplicates":
+        return cli_find_duplicates(args)
+    if args.command == "verify-ledger":
+        return cli_verify_ledger(args)
+    host, port = parse_bind(getattr(args, "bind", BIND))
     print("Starting Smart Voting single-file (with admin).")
-    print("DB path:", DB_PATH)
-    APP.run(host="0.0.0.0", port=5000, debug=True)
+    print("DB path:", ", ".join(str(p) for p in get_router().paths))
+    APP.run(host=host, port=port, debug=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+svm_bench.py
+Stress and benchmark tooling for smart_voting_system.py.
+
+
+Every command works on a throw-away database in a temporary directory, never
+on svm_admin.db.
+
+
+Run:
+  python svm_bench.py stress --voters 500 --processes 4 --threads 8
+  python svm_bench.py stress --voters 500 --processes 4 --threads 8 --shards 4
+  python svm_bench.py fp --iterations 20000 --captures 3
+  python svm_bench.py e2e --sizes 1000,10000,100000 --votes 500 --concurrency 8 --mode both --out e2e.json
+  python svm_bench.py e2e --mode server --server-workers 4 --concurrency 32
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+def _load_app(db_path, shards=None):
+    """
+    Imports the app and sets it up on db_path with create_app(). Every simulated
+    kiosk shares 127.0.0.1, so the per-client API rate limit is turned off (also
+    for the production server subprocess, which inherits the environment).
+    """
+    os.environ.setdefault("SVM_API_RATE", "0")
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import smart_voting_system as svm
+    svm.create_app(db_path, shards)
+    return svm
+
+
+def seed_voters(svm, count, prefix="STRESS"):
+    """Inserts count adult voters and returns their voter_ids."""
+    ids = [f"{prefix}{i:07d}" for i in range(count)]
+    by_shard = {}
+    for v in ids:
+        by_shard.setdefault(svm.shard_for(v), []).append(
+            (v, f"Voter {v}", "1980-01-01", "", svm.fp_template_blob("fp-" + v), "2000-01-01T00:00:00"))
+    for shard, rows in by_shard.items():
+        with svm.db_conn(shard) as conn:
+            conn.executemany(
+                "INSERT INTO voters (voter_id, name, dob, phone, fp_template, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+            conn.commit()
+    return ids
+
+
+# --------------------
+# stress: concurrent cast_vote on the same voters
+# --------------------
+def _stress_threads(db_path, shards, voter_ids, threads, seed):
+    """Runs `threads` threads that each try to vote for every voter; returns outcome counts."""
+    svm = _load_app(db_path, shards)
+    counts = {}
+    lock = threading.Lock()
+    candidates = ["Candidate A", "Candidate B", "Candidate C"]
+
+    def worker(n):
+        order = list(voter_ids)
+        random.Random(seed * 1000 + n).shuffle(order)
+        local = {}
+        for voter_id in order:
+            cast_at = int(time.time())
+            with svm.db_conn(svm.shard_for(voter_id)) as conn:
+                outcome, _ = svm.run_in_transaction(conn, svm.record_vote, voter_id, random.choice(candidates),
+                                                    cast_at)
+            local[outcome] = local.get(outcome, 0) + 1
+        with lock:
+            for k, v in local.items():
+                counts[k] = counts.get(k, 0) + v
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return counts
+
+
+def _stress_process(args):
+    """multiprocessing entry point."""
+    return _stress_threads(*args)
+
+
+def cmd_stress(opts):
+    """Hammers record_vote from several processes and threads and checks one vote per voter."""
+    tmp = Path(tempfile.mkdtemp(prefix="svm_stress_"))
+    db_path = tmp / "stress.db"
+    svm = _load_app(db_path, opts.shards)
+    voter_ids = seed_voters(svm, opts.voters)
+
+    started = time.perf_counter()
+    if opts.processes > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(opts.processes) as pool:
+            results = pool.map(_stress_process, [(db_path, opts.shards, voter_ids, opts.threads, p)
+                                                 for p in range(opts.processes)])
+    else:
+        results = [_stress_threads(db_path, opts.shards, voter_ids, opts.threads, 0)]
+    elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for r in results:
+        for k, v in r.items():
+            outcomes[k] = outcomes.get(k, 0) + v
+    total_votes = duplicated = not_marked = 0
+    for shard in svm.all_shards():
+        with svm.db_conn(shard) as conn:
+            total_votes += conn.execute("SELECT COUNT(*) FROM votes").fetchone()[0]
+            duplicated += conn.execute(
+                "SELECT COUNT(*) FROM (SELECT voter_id FROM votes GROUP BY voter_id HAVING COUNT(*) > 1)").fetchone()[0]
+            not_marked += conn.execute("SELECT COUNT(*) FROM voters WHERE has_voted=0").fetchone()[0]
+    tally_mismatches = svm.check_all_tallies()
+
+    attempts = sum(outcomes.values())
+    report = {
+        "voters": opts.voters,
+        "shards": opts.shards,
+        "processes": opts.processes,
+        "threads_per_process": opts.threads,
+        "attempts": attempts,
+        "outcomes": outcomes,
+        "votes_in_table": total_votes,
+        "voters_with_duplicate_votes": duplicated,
+        "voters_not_marked": not_marked,
+        "tally_mismatches": len(tally_mismatches),
+        "elapsed_s": round(elapsed, 4),
+        "votes_per_s": round(total_votes / elapsed, 1),
+        "attempts_per_s": round(attempts / elapsed, 1),
+    }
+    report["ok"] = (total_votes == opts.voters and outcomes.get("recorded") == opts.voters
+                    and duplicated == 0 and not_marked == 0 and not tally_mismatches)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+# --------------------
+# fp: 1:1 fingerprint verification micro-benchmark
+# --------------------
+def _percentiles(samples, points=(50, 95, 99)):
+    """Returns {"p50": ..., ...} in milliseconds from a list of seconds."""
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 4) for p in points}
+
+
+def cmd_fp(opts):
+    """Times fp_verify() on noisy genuine and impostor probes."""
+    import numpy as np
+    svm = _load_app(Path(tempfile.mkdtemp(prefix="svm_fp_")) / "fp.db")
+    rng = np.random.default_rng(opts.seed)
+    enrolled = rng.integers(0, 256, svm.FP_DIM)
+    template = svm.fp_template_blob(enrolled.tolist())
+
+    def capture(genuine):
+        base = enrolled if genuine else rng.integers(0, 256, svm.FP_DIM)
+        return np.clip(base + rng.normal(0, opts.noise, svm.FP_DIM), 0, 255).round().astype(int).tolist()
+
+    probes = [[capture(i % 2 == 0) for _ in range(opts.captures)] for i in range(min(opts.iterations, 1000))]
+    timings, correct = [], 0
+    for i in range(opts.iterations):
+        payload = probes[i % len(probes)]
+        started = time.perf_counter()
+        ok = svm.fp_verify(template, payload)
+        timings.append(time.perf_counter() - started)
+        correct += ok == (i % len(probes) % 2 == 0)
+    report = {"iterations": opts.iterations, "captures_per_attempt": opts.captures, "noise_sd": opts.noise,
+              "threshold": svm.FP_MATCH_THRESHOLD, "accuracy": round(correct / opts.iterations, 4),
+              "mean_ms": round(sum(timings) / len(timings) * 1000, 4), **_percentiles(timings)}
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+# --------------------
+# e2e: the voting flow and admin pages, end to end
+# --------------------
+class ClientTransport:
+    """Sends requests through the Flask test client (no sockets); one client per thread."""
+
+    name = "client"
+
+    def __init__(self, svm):
+        self.app = svm.APP
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def login(self):
+        with self._client().session_transaction() as sess:
+            sess["admin"] = True
+
+    def post_json(self, path, body):
+        resp = self._client().post(path, json=body)
+        return resp.status_code, resp.get_json(silent=True) or {}
+
+    def get(self, path):
+        resp = self._client().get(path)
+        return resp.status_code, len(resp.data)
+
+
+class HttpTransport:
+    """Sends requests over keep-alive HTTP connections to a running server; one connection per thread."""
+
+    name = "server"
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookie = ""
+        self._local = threading.local()
+
+    def _request(self, method, path, body=None, headers=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = dict(headers or {}, Cookie=self.cookie) if self.cookie else dict(headers or {})
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            return resp, resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def login(self, user, password):
+        body = f"username={user}&password={password}".encode("utf-8")
+        resp, _ = self._request("POST", "/admin", body, {"Content-Type": "application/x-www-form-urlencoded"})
+        self.cookie = (resp.getheader("Set-Cookie") or "").split(";", 1)[0]
+
+    def post_json(self, path, body):
+        resp, data = self._request("POST", path, json.dumps(body).encode("utf-8"),
+                                   {"Content-Type": "application/json"})
+        try:
+            return resp.status, json.loads(data)
+        except ValueError:
+            return resp.status, {}
+
+    def get(self, path):
+        resp, data = self._request("GET", path)
+        return resp.status, len(data)
+
+
+def _start_server(svm):
+    """Serves the app on an ephemeral localhost port from a background thread; returns (stop, port)."""
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, svm.APP, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown, server.server_port
+
+
+def _start_production_server(svm, workers):
+    """Starts `smart_voting_system.py serve` with `workers` processes on the bench database; returns (stop, port)."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, str(Path(svm.__file__)), "--db", str(svm.DB_PATH),
+                             "--shards", str(svm.NUM_SHARDS), "serve", "--bind", f"127.0.0.1:{port}",
+                             "--workers", str(workers)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                break
+        except OSError:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise SystemExit("production server did not start")
+            time.sleep(0.2)
+
+    def stop():
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(60)
+    return stop, port
+
+
+def _summarize(samples, errors, elapsed):
+    """Count, error count, throughput and latency percentiles for one endpoint."""
+    report = {"count": len(samples), "errors": errors,
+              "per_s": round(len(samples) / elapsed, 1) if elapsed else None}
+    if samples:
+        report.update(mean_ms=round(sum(samples) / len(samples) * 1000, 3), **_percentiles(samples))
+    return report
+
+
+def _vote_flow(transport, voter_ids, concurrency):
+    """Runs QR -> fingerprint -> cast_vote for every voter over `concurrency` threads; returns the report."""
+    steps = ("verify_qr", "verify_fingerprint", "cast_vote", "flow")
+    timings = {step: [] for step in steps}
+    errors = {step: 0 for step in steps}
+    lock = threading.Lock()
+    work = iter(voter_ids)
+    candidates = ["Candidate A", "Candidate B", "Candidate C"]
+
+    def timed(step, local, fn):
+        started = time.perf_counter()
+        status, data = fn()
+        local[step].append(time.perf_counter() - started)
+        return data if status == 200 and data.get("ok") else None
+
+    def worker():
+        local = {step: [] for step in steps}
+        failed = {step: 0 for step in steps}
+        while True:
+            with lock:
+                voter_id = next(work, None)
+            if voter_id is None:
+                break
+            flow = (
+                ("verify_qr", "/api/verify_qr", lambda ticket: {"voter_id": voter_id}),
+                ("verify_fingerprint", "/api/verify_fingerprint",
+                 lambda ticket: {"voter_id": voter_id, "fp_payload": "fp-" + voter_id, "ticket": ticket}),
+                ("cast_vote", "/api/cast_vote",
+                 lambda ticket: {"voter_id": voter_id, "candidate": random.choice(candidates), "ticket": ticket}),
+            )
+            started, ticket = time.perf_counter(), None
+            for step, path, body in flow:
+                data = timed(step, local, lambda: transport.post_json(path, body(ticket)))
+                if data is None:
+                    failed[step] += 1
+                    failed["flow"] += 1
+                    break
+                ticket = data.get("ticket")
+            else:
+                local["flow"].append(time.perf_counter() - started)
+        with lock:
+            for step in steps:
+                timings[step].extend(local[step])
+                errors[step] += failed[step]
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    report = {step: _summarize(timings[step], errors[step], elapsed) for step in steps}
+    report["elapsed_s"] = round(elapsed, 3)
+    return report
+
+
+def _admin_pages(svm, transport, repeats):
+    """Times the admin list (first, deep and filtered pages) and the full streaming exports."""
+    with svm.db_conn() as conn:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM voters").fetchone()[0]
+    deep = svm.format_list_cursor((max_id // 2, 0))
+    pages = {
+        "list_first_page": "/admin/list",
+        "list_deep_page": f"/admin/list?after={deep}",
+        "list_prefix_filter": "/admin/list?q=R1&has_voted=0",
+        "export_voters_csv": "/admin/export/voters.csv",
+        "export_votes_ndjson": "/admin/export/votes.ndjson",
+    }
+    report = {}
+    for name, path in pages.items():
+        samples, errors, size = [], 0, 0
+        for _ in range(repeats):
+            started = time.perf_counter()
+            status, size = transport.get(path)
+            samples.append(time.perf_counter() - started)
+            errors += status != 200
+        report[name] = dict(_summarize(samples, errors, sum(samples)), bytes=size)
+    return report
+
+
+def cmd_e2e(opts):
+    """
+    Grows a throw-away roll through each size in --sizes and, at every size,
+    votes --votes fresh voters through the real QR -> fingerprint -> cast_vote
+    sequence and times the admin pages, through the test client and/or a live
+    HTTP server. Console logging is silenced so it does not dominate timings.
+    """
+    sizes = sorted(int(n) for n in opts.sizes.split(","))
+    modes = ("client", "server") if opts.mode == "both" else (opts.mode,)
+    if opts.votes * len(modes) > sizes[0]:
+        raise SystemExit("--votes (times the number of modes) must not exceed the smallest roll size")
+    tmp = Path(tempfile.mkdtemp(prefix="svm_e2e_"))
+    svm = _load_app(tmp / "e2e.db", opts.shards)
+    logging.disable(logging.WARNING)
+    rng = random.Random(opts.seed)
+    transports = {"client": ClientTransport(svm)}
+    stop_server = None
+    if "server" in modes:
+        if opts.server_workers:
+            stop_server, port = _start_production_server(svm, opts.server_workers)
+        else:
+            stop_server, port = _start_server(svm)
+        transports["server"] = HttpTransport("127.0.0.1", port)
+        transports["server"].login(svm.ADMIN_USER, svm.ADMIN_PASS)
+    transports["client"].login()
+
+    runs, unvoted, seeded = [], [], 0
+    try:
+        for size in sizes:
+            seed_started = time.perf_counter()
+            new_ids = seed_voters(svm, size - seeded, prefix=f"R{len(runs) + 1}-")
+            seed_s = time.perf_counter() - seed_started
+            unvoted.extend(new_ids)
+            seeded = size
+            for mode in modes:
+                rng.shuffle(unvoted)
+                batch, unvoted[:] = unvoted[:opts.votes], unvoted[opts.votes:]
+                run = {"roll_size": size, "mode": mode, "seed_s": round(seed_s, 3),
+                       "vote_flow": _vote_flow(transports[mode], batch, opts.concurrency),
+                       "admin": _admin_pages(svm, transports[mode], opts.admin_repeats)}
+                runs.append(run)
+                flow = run["vote_flow"]["flow"]
+                print(f"size={size} mode={mode} flows/s={flow['per_s']} p50={flow.get('p50')}ms "
+                      f"p99={flow.get('p99')}ms errors={flow['errors']}", file=sys.stderr)
+    finally:
+        if stop_server is not None:
+            stop_server()
+        logging.disable(logging.NOTSET)
+
+    report = {
+        "benchmark": "e2e",
+        "started_at": datetime.utcnow().isoformat(),
+        "config": {"sizes": sizes, "votes": opts.votes, "concurrency": opts.concurrency, "modes": list(modes),
+                   "server_workers": opts.server_workers,
+                   "shards": opts.shards, "admin_repeats": opts.admin_repeats, "seed": opts.seed,
+                   "python": sys.version.split()[0], "cpus": os.cpu_count()},
+        "runs": runs,
+    }
+    report["ok"] = all(r["vote_flow"]["flow"]["errors"] == 0 for r in runs)
+    text = json.dumps(report, indent=2)
+    if opts.out:
+        Path(opts.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+    return 0 if report["ok"] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Voting stress and benchmark tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("stress", help="concurrent cast_vote; exactly one vote must land per voter")
+    p.add_argument("--voters", type=int, default=500)
+    p.add_argument("--processes", type=int, default=4)
+    p.add_argument("--threads", type=int, default=8, help="threads per process")
+    p.add_argument("--shards", type=int, default=1, help="SVM_SHARDS for the throw-away database")
+    p.set_defaults(func=cmd_stress)
+    p = sub.add_parser("fp", help="1:1 fingerprint verification latency")
+    p.add_argument("--iterations", type=int, default=20000)
+    p.add_argument("--captures", type=int, default=1, help="probe captures scored per attempt")
+    p.add_argument("--noise", type=float, default=15.0, help="std-dev of simulated sensor noise")
+    p.add_argument("--seed", type=int, default=7)
+    p.set_defaults(func=cmd_fp)
+    p = sub.add_parser("e2e", help="end-to-end voting flow and admin page latency at several roll sizes")
+    p.add_argument("--sizes", default="1000,10000,100000", help="comma-separated roll sizes, grown in order")
+    p.add_argument("--votes", type=int, default=500, help="voters taken through the flow per size and mode")
+    p.add_argument("--concurrency", type=int, default=8, help="concurrent kiosks (threads)")
+    p.add_argument("--mode", choices=("client", "server", "both"), default="both")
+    p.add_argument("--admin-repeats", type=int, default=5)
+    p.add_argument("--server-workers", type=int, default=0,
+                   help="server mode: run the pre-fork production server with this many workers "
+                        "instead of an in-process werkzeug server")
+    p.add_argument("--shards", type=int, default=1, help="SVM_SHARDS for the throw-away database")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="also write the JSON report to this file")
+    p.set_defaults(func=cmd_e2e)
+    opts = parser.parse_args(argv)
+    return opts.func(opts)
+
+
+if __name__ == "__main__":
+    sys.exit(main())